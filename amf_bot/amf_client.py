@@ -0,0 +1,109 @@
+# AMF istekleri için istemci katmanı: süre sınırları, geçici hatalarda rastgele (jitter) geri çekilmeli
+# yeniden deneme ve devre kesici. fetch_person.py tarafından kullanılır.
+import time
+import random
+import threading
+
+import requests
+
+# Yeniden denenebilir HTTP durumları (sorgular salt okunur olduğu için tekrar göndermek güvenli)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class SessionExpiredError(Exception): pass
+class CircuitOpenError(Exception): pass
+class DeadlineExceeded(Exception): pass
+class Cancelled(Exception): pass
+
+class Deadline:
+    # Hane başına toplam süre sınırı; seconds boşsa sınırsız
+    def __init__(self, seconds=None):
+        self.at = time.monotonic() + seconds if seconds else None
+
+    def remaining(self):
+        return None if self.at is None else max(0.0, self.at - time.monotonic())
+
+    def expired(self):
+        return self.at is not None and time.monotonic() >= self.at
+
+class CircuitBreaker:
+    # Art arda `threshold` başarısız çağrıdan (yeniden denemeleri tükenmiş) sonra `cooldown` saniye boyunca istek gönderilmez.
+    # Süre dolunca tek bir deneme isteği geçer; başarılıysa devre kapanır, değilse yeniden açılır.
+    def __init__(self, threshold=5, cooldown=30.0):
+        self.threshold, self.cooldown = threshold, cooldown
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def state(self):
+        if self.opened_at is None: return "closed"
+        return "half-open" if self.probing or time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self):
+        # İzin verildiyse "closed" ya da "half-open" (bu çağrı deneme isteğidir), verilmediyse None
+        with self.lock:
+            if self.opened_at is None: return "closed"
+            if self.probing or time.monotonic() - self.opened_at < self.cooldown: return None
+            self.probing = True
+            return "half-open"
+
+    def success(self):
+        with self.lock:
+            self.failures, self.opened_at, self.probing = 0, None, False
+
+    def release(self):
+        # Deneme isteği sonuçsuz kaldı (iptal, oturum hatası); devre durumu değişmez
+        with self.lock: self.probing = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            # Devre zaten açıksa geç biten çağrılar bekleme süresini uzatmaz
+            if self.probing or (self.opened_at is None and self.failures >= self.threshold):
+                self.opened_at, self.probing = time.monotonic(), False
+
+def backoff(attempt, base=0.25, cap=2.0):
+    # "Full jitter": aynı anda hata alan istekler aynı anda tekrar denemesin
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def call_with_retry(send, timeout, retries=2, deadline=None, breaker=None, cancel=None, attempts=None):
+    # send(timeout) bir requests cevabı döndürür. Bağlantı hatası, zaman aşımı ve RETRY_STATUSES en fazla `retries`
+    # kez yeniden denenir; diğer cevaplar (oturum hatası dahil) olduğu gibi döner. attempts (list) deneme sayısını alır.
+    # Devre kesiciye çağrı başına (denemeler tükenince) tek hata yazılır. Devre arada açılırsa yeniden denenmez ve
+    # CircuitOpenError yerine asıl hata yükselir; deneme isteği (half-open) yeniden denenmez.
+    attempt, mode = 0, None
+    while True:
+        if cancel is not None and cancel.is_set(): raise Cancelled("iptal edildi")
+        call_timeout = timeout
+        if deadline is not None and deadline.at is not None:
+            if deadline.expired(): raise DeadlineExceeded("süre sınırı aşıldı")
+            call_timeout = min(timeout, deadline.remaining())
+        if breaker is not None and attempt == 0:
+            mode = breaker.allow()
+            if mode is None: raise CircuitOpenError("devre açık, istek gönderilmedi")
+        if attempts is not None: attempts.append(attempt)
+        try:
+            resp = send(call_timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            err = e
+        except BaseException:
+            if breaker is not None: breaker.release()
+            raise
+        else:
+            if resp.status_code not in RETRY_STATUSES:
+                if breaker is not None: breaker.success()
+                return resp
+            err = requests.HTTPError(f"HTTP {resp.status_code}", response=resp)
+        delay = backoff(attempt)
+        if attempt >= retries or mode == "half-open" or (deadline is not None and deadline.at is not None and deadline.remaining() <= delay):
+            if breaker is not None: breaker.failure()
+            raise err
+        if cancel is not None:
+            if cancel.wait(delay): raise Cancelled("iptal edildi")
+        else: time.sleep(delay)
+        # Bekleme sırasında diğer çağrılar devreyi açtıysa bu çağrı yeniden denenmeden düşer
+        if breaker is not None and breaker.state != "closed":
+            breaker.failure()
+            raise err
+        attempt += 1
@@ -0,0 +1,208 @@
+# fetch_person.py için performans ölçümleri. Her sonuç tek satır JSON olarak yazılır.
+# Ağ gerektiren ölçümler canlı sisteme değil, HAR'dan kurulan yerel replay sunucusuna gider.
+#   python amf_bot/bench.py                                  # tüm benchmark'lar
+#   python amf_bot/bench.py fix_turkish batch                # yalnızca seçilenler
+#   python amf_bot/bench.py --output yeni.json --baseline eski.json   # gerilemede çıkış kodu 1
+import io
+import os
+import re
+import sys
+import json
+import time
+import types
+import argparse
+import platform
+import tempfile
+import contextlib
+
+import fetch_person as fp
+from replay_server import ReplayServer, load_har_responses
+from check_turkish import check_turkish_golden
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+REPLAY_HAR = os.path.join(FIXTURES_DIR, 'replay.har')
+
+BENCHMARKS = {}
+
+def benchmark(fn):
+    BENCHMARKS[fn.__name__[len('bench_'):]] = fn
+    return fn
+
+def measure(fn, *args, repeat=5, min_time=0.2):
+    # Çağrı sayısı toplam süre ~min_time olacak şekilde ayarlanır; en iyi tekrarın çağrı başına süresi döner
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number): fn(*args)
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time / repeat: break
+        number *= 2
+    best = elapsed
+    for _ in range(repeat - 1):
+        t0 = time.perf_counter()
+        for _ in range(number): fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best / number
+
+def legacy_fix_turkish(s):
+    # Karşılaştırma için eski sıralı str.replace zinciri
+    s = s.replace('\xc5\x9e', 'Ş')
+    s = s.replace('\xc5\x9f', 'ş')
+    s = s.replace('\xc4\x9e', 'Ğ')
+    s = s.replace('\xc4\x9f', 'ğ')
+    s = s.replace('\xc4\xb0', 'İ')
+    s = s.replace('\xc3\x9c', 'Ü')
+    s = s.replace('\xc3\x96', 'Ö')
+    s = s.replace('\xc3\x87', 'Ç')
+    repls = {
+        'Ã\x83Â¼': 'ü', 'Ã\x84Â±': 'ı', 'Ã\x85Â\x9f': 'ş', 'Ã\x84Â\x9f': 'ğ',
+        'Ã\x83Â¶': 'ö', 'Ã\x83Â§': 'ç', 'Ã\x84Â°': 'İ', 'Ã\x83Â\x9c': 'Ü',
+        'Ã\x83Â–': 'Ö', 'Ã\x83Â‡': 'Ç', 'Ã\x85Âž': 'Ş', 'Ã\x84Â\x9e': 'Ğ',
+        'Ã¼': 'ü', 'Ã¶': 'ö', 'Ã§': 'ç', 'ÅŸ': 'ş', 'Ä±': 'ı', 'ÄŸ': 'ğ',
+        'Ãœ': 'Ü', 'Ã–': 'Ö', 'Ã‡': 'Ç', 'Åž': 'Ş', 'Ä°': 'İ', 'Äž': 'Ğ',
+        'Â': '', 'Ã': 'ı', 'Ä': 'İ'
+    }
+    for old, new in repls.items():
+        s = s.replace(old, new)
+    s = re.sub(r'[\x00-\x1F\x7F-\x9F]', '', s)
+    return s.strip()
+
+SAMPLE_TEXT = ("<b>Hane Ziyareti Notu</b> Ailede dört kişi yaşıyor, eşi vefat etmiş. Çocuklar okula gidiyor. "
+               "TOPLAM : 12.500,50 TL KİŞİ BAŞI AYLIK GELİR : 3.125,10 <b>Diğer Eğitim Yardımı</b>   20 Şubat 2026   "
+               "Tamamlandı   2.000,00TL Sağlık Güvencesi(Kendisi - 60/c1 yeşilkart) ŞİŞLİ/İSTANBUL\r\n")
+
+def sample_response(size):
+    # Sunucu cevapları latin1 ile çözüldüğü için UTF-8 Türkçe karakterler bozuk gelir
+    raw = SAMPLE_TEXT.encode('utf-8').decode('latin1')
+    return (raw * (size // len(raw) + 1))[:size]
+
+@contextlib.contextmanager
+def replay_session(har_path, latency, sessions=1):
+    # HAR'daki cevaplar yerel sunucudan oynatılır; fetch_person aynı HAR'ın URL'i değiştirilmiş kopyasını kullanır.
+    # sessions > 1 ise kopyalar bir klasöre yazılır ve oturum havuzu olarak kullanılır.
+    server = ReplayServer(load_har_responses(har_path), latency=latency).start()
+    saved = fp.HAR_PATH, fp.CACHE_PATH, fp.SESSION_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        entries = []
+        for entry in fp.iter_har_entries(har_path):
+            if 'amf' in entry['request'].get('url', ''): entry['request']['url'] = server.url
+            entries.append(entry)
+        for i in range(sessions):
+            fp.HAR_PATH = os.path.join(tmp, f'replay{i}.har')
+            with open(fp.HAR_PATH, 'w', encoding='utf-8') as f: json.dump({"log": {"entries": entries}}, f)
+        fp.SESSION_DIR = tmp if sessions > 1 else None
+        fp.CACHE_PATH = 'off'
+        try: yield server
+        finally:
+            fp.HAR_PATH, fp.CACHE_PATH, fp.SESSION_DIR = saved
+            server.stop()
+
+def replayed_response(har_path, key):
+    return types.SimpleNamespace(content=load_har_responses(har_path)[key], status_code=200)
+
+@benchmark
+def bench_fix_turkish(args):
+    total, failed = check_turkish_golden()
+    yield {"name": "fix_turkish.golden", "cases": total, "failed": failed}
+    if failed: raise SystemExit(1)
+    for size in (2_000, 8_000, 32_000):
+        txt = sample_response(size)
+        new, old = measure(fp.fix_turkish, txt), measure(legacy_fix_turkish, txt)
+        yield {"name": f"fix_turkish[{size}B]", "us": round(new * 1e6, 2), "legacy_us": round(old * 1e6, 2), "speedup": round(old / new, 2)}
+    # extract_strings ve adres alanları gibi kısa metinler
+    fields = sample_response(2_000).split()
+    new = measure(lambda: [fp.fix_turkish(s) for s in fields])
+    old = measure(lambda: [legacy_fix_turkish(s) for s in fields])
+    yield {"name": f"fix_turkish[{len(fields)} short]", "us": round(new * 1e6, 2), "legacy_us": round(old * 1e6, 2), "speedup": round(old / new, 2)}
+
+@benchmark
+def bench_build_request(args):
+    session = fp.extract_session(fp.iter_har_entries(args.har))
+    for key in sorted(session["templates"]):
+        yield {"name": f"build_request[{key}]", "us": round(measure(fp.build_request, session["templates"], key, 5551234) * 1e6, 2),
+               "full_encode_us": round(measure(fp.encode_request, session["templates"], key, 5551234) * 1e6, 2)}
+
+@benchmark
+def bench_extract_strings(args):
+    resp = replayed_response(args.har, 'getEntitiesWithTouchedProperties_HouseRecord')
+    yield {"name": f"extract_strings[{len(resp.content)}B]", "us": round(measure(fp.extract_strings, resp.content) * 1e6, 2)}
+    yield {"name": "parse_house_record", "us": round(measure(lambda: fp.parse_house_record({}, resp)) * 1e6, 2)}
+
+@benchmark
+def bench_aid_summary(args):
+    resp = replayed_response(args.har, 'getAidSummaryOfHouseRecord')
+    kisi = {"assistance_records": []}
+    yield {"name": f"parse_aid_summary[{len(resp.content)}B]", "us": round(measure(fp.parse_aid_summary, kisi, resp) * 1e6, 2)}
+
+@benchmark
+def bench_fetch_data(args):
+    # Uçtan uca tek hane: HAR/oturum yükleme hariç, ağ gecikmesi dahil
+    with replay_session(args.har, args.latency) as server:
+        fp.load_session()
+        first = fp.fetch_data(1000001)
+        if "error" in first: raise SystemExit(f"fetch_data hatası: {first['error']}")
+        n = args.households
+        t0 = time.perf_counter()
+        for i in range(n): fp.fetch_data(1000001 + i)
+        elapsed = time.perf_counter() - t0
+        yield {"name": "fetch_data", "us": round(elapsed / n * 1e6, 2), "households": n, "latency_ms": args.latency * 1000,
+               "requests": sum(server.hits.values())}
+
+@benchmark
+def bench_batch(args):
+    # --sessions/--rps ile oturum başına hız sınırında havuzun ölçeklenmesi görülür
+    with replay_session(args.har, args.latency, sessions=args.sessions) as server:
+        n = args.households * 4
+        out = io.BytesIO()
+        t0 = time.perf_counter()
+        status = fp.run_batch([str(1000001 + i) for i in range(n)], concurrency=args.concurrency, rps=args.rps, stdout=out)
+        elapsed = time.perf_counter() - t0
+        lines = out.getvalue().splitlines()
+        errors = sum(1 for l in lines if '"error"' in l.decode('utf-8'))
+        name = f"batch[c={args.concurrency}" + (f",sessions={args.sessions}" if args.sessions > 1 else "") + (f",rps={args.rps:g}" if args.rps else "") + "]"
+        yield {"name": name, "us": round(elapsed / n * 1e6, 2), "households_per_s": round(n / elapsed, 2),
+               "households": n, "errors": errors, "status": status, "latency_ms": args.latency * 1000, "requests": sum(server.hits.values())}
+
+def compare(results, baseline_path, threshold):
+    # Aynı isimli sonuçların "us" değeri eşik oranından fazla arttıysa gerileme sayılır
+    with open(baseline_path, 'r', encoding='utf-8') as f: baseline = {r["name"]: r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        old = baseline.get(r["name"], {}).get("us")
+        if old and r.get("us") and r["us"] > old * threshold:
+            regressions.append({"name": r["name"], "us": r["us"], "baseline_us": old, "ratio": round(r["us"] / old, 2)})
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="fetch_person.py benchmark'ları")
+    parser.add_argument('names', nargs='*', help=f"Çalıştırılacak benchmark'lar ({', '.join(BENCHMARKS)})")
+    parser.add_argument('--har', default=REPLAY_HAR, help="Şablonların ve tekrar oynatılacak cevapların alınacağı HAR")
+    parser.add_argument('--latency', type=float, default=0.02, help="Replay sunucusunun cevap başına gecikmesi (saniye)")
+    parser.add_argument('--households', type=int, default=20, help="Uçtan uca ölçümde sorgulanan hane sayısı")
+    parser.add_argument('--concurrency', type=int, default=8, help="Toplu ölçümde eşzamanlı hane sayısı")
+    parser.add_argument('--sessions', type=int, default=1, help="Toplu ölçümde kullanılacak oturum (HAR kopyası) sayısı")
+    parser.add_argument('--rps', type=float, default=None, help="Toplu ölçümde oturum başına istek sınırı")
+    parser.add_argument('--output', help="Tüm sonuçların yazılacağı JSON dosyası")
+    parser.add_argument('--baseline', help="Karşılaştırılacak önceki --output dosyası")
+    parser.add_argument('--threshold', type=float, default=1.25, help="Gerileme sayılacak süre oranı")
+    args = parser.parse_args(argv)
+
+    results = []
+    for name in args.names or BENCHMARKS:
+        if name not in BENCHMARKS: parser.error(f"bilinmeyen benchmark: {name}")
+        for res in BENCHMARKS[name](args):
+            results.append(res)
+            print(json.dumps(res, ensure_ascii=False), flush=True)
+
+    if args.output:
+        doc = {"created_at": time.strftime('%Y-%m-%dT%H:%M:%S'), "python": platform.python_version(), "platform": platform.platform(),
+               "har": os.path.basename(args.har), "latency": args.latency, "results": results}
+        with open(args.output, 'w', encoding='utf-8') as f: json.dump(doc, f, ensure_ascii=False, indent=1)
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.threshold)
+        for r in regressions: print(json.dumps({"regression": r}, ensure_ascii=False), file=sys.stderr)
+        if regressions: return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
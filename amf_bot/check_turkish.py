@@ -0,0 +1,26 @@
+# fix_turkish'in kayıtlı girdi/çıktı çiftleriyle (fixtures/turkish_golden.json, eski replace zincirinden üretildi)
+# birebir aynı sonucu verdiğini kontrol eder. Süre ölçümü yapmaz; fark varsa çıkış kodu 1.
+#   python amf_bot/check_turkish.py
+import os
+import sys
+import json
+
+import fetch_person as fp
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'turkish_golden.json')
+
+def check_turkish_golden(path=GOLDEN_PATH):
+    # (vaka sayısı, farklı sonuç sayısı); ilk farklar stderr'e yazılır
+    with open(path, 'r', encoding='utf-8') as f: golden = json.load(f)
+    bad = [(src, want, fp.fix_turkish(src)) for src, want in golden if fp.fix_turkish(src) != want]
+    for src, want, got in bad[:5]:
+        print(f"fix_turkish farkı: {src!r} -> {got!r} (beklenen {want!r})", file=sys.stderr)
+    return len(golden), len(bad)
+
+def main():
+    total, failed = check_turkish_golden()
+    print(json.dumps({"cases": total, "failed": failed}))
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,8 +8,20 @@ import sys
 import io
 import uuid
 import re
+import time
+import hashlib
+import struct
+import sqlite3
+import argparse
+import threading
 import pyamf.amf3
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from result_cache import ResultCache
+from metrics_registry import MetricsRegistry
+from amf_client import CircuitBreaker, Deadline, SessionExpiredError, call_with_retry
+from session_pool import SessionHealth, SessionPool
 
 # Windows terminal kodlama hatasını önlemek için
 if sys.stdout.encoding != 'utf-8':
@@ -22,31 +34,44 @@ def safe_readDate(self):
     except: return None
 pyamf.amf3.Decoder.readDate = safe_readDate
 
+# pyamf XML kütüphanelerini ilk encode sırasında tembel yükler ve bu adım thread-safe değil;
+# eşzamanlı isteklerden önce ana thread'de yüklenir
+import pyamf.xml
+pyamf.xml.is_xml(None)
+
+# Bozuk kodlama düzeltmeleri. Hiçbir kalıp başka bir düzeltmenin çıktısıyla oluşamadığı için
+# en uzun kalıbı önce deneyen tek geçiş, eski sıralı str.replace zinciriyle aynı sonucu verir.
+TURKISH_FIXES = {
+    # Kontrol karakteri içeren byte çiftleri
+    '\xc5\x9e': 'Ş', '\xc5\x9f': 'ş', '\xc4\x9e': 'Ğ', '\xc4\x9f': 'ğ',
+    '\xc4\xb0': 'İ', '\xc3\x9c': 'Ü', '\xc3\x96': 'Ö', '\xc3\x87': 'Ç',
+    # Standart latin1→UTF-8 bozulmaları
+    'Ã\x83Â¼': 'ü', 'Ã\x84Â±': 'ı', 'Ã\x85Â\x9f': 'ş', 'Ã\x84Â\x9f': 'ğ',
+    'Ã\x83Â¶': 'ö', 'Ã\x83Â§': 'ç', 'Ã\x84Â°': 'İ', 'Ã\x83Â\x9c': 'Ü',
+    'Ã\x83Â–': 'Ö', 'Ã\x83Â‡': 'Ç', 'Ã\x85Âž': 'Ş', 'Ã\x84Â\x9e': 'Ğ',
+    'Ã¼': 'ü', 'Ã¶': 'ö', 'Ã§': 'ç', 'ÅŸ': 'ş', 'Ä±': 'ı', 'ÄŸ': 'ğ',
+    'Ãœ': 'Ü', 'Ã–': 'Ö', 'Ã‡': 'Ç', 'Åž': 'Ş', 'Äž': 'Ğ',
+    'Â': '', # Remove weird circumflex artifacts
+    'Ã': 'ı', # Catch-all for certain weird encodings
+    'Ä': 'İ'  # common at the end of words like CADDESİ
+}
+_turkish_fix_re = re.compile('|'.join(re.escape(k) for k in sorted(TURKISH_FIXES, key=len, reverse=True)) + r'|[\x00-\x1F\x7F-\x9F]')
+# Kalıpların tamamı yazdırılabilir ASCII dışındaki karakterlerden oluşur: metin bu dizilere bölünür
+# ve her farklı dizi bir kez düzeltilip saklanır (Türkçe metinde farklı dizi sayısı çok azdır)
+_non_ascii_run_re = re.compile(r'([^\x20-\x7E]+)')
+_fixed_runs = {}
+
+def _fix_run(run):
+    fixed = _turkish_fix_re.sub(lambda m: TURKISH_FIXES.get(m.group(), ''), run)
+    if len(_fixed_runs) >= 4096: _fixed_runs.clear()
+    _fixed_runs[run] = fixed
+    return fixed
+
 def fix_turkish(s):
-    # Önce kontrol karakteri içeren byte çiftlerini düzelt (strip'ten ÖNCE yapılmalı)
-    s = s.replace('\xc5\x9e', 'Ş')  # Büyük Ş
-    s = s.replace('\xc5\x9f', 'ş')  # Küçük ş
-    s = s.replace('\xc4\x9e', 'Ğ')  # Büyük Ğ
-    s = s.replace('\xc4\x9f', 'ğ')  # Küçük ğ
-    s = s.replace('\xc4\xb0', 'İ')  # Büyük İ
-    s = s.replace('\xc3\x9c', 'Ü')  # Büyük Ü
-    s = s.replace('\xc3\x96', 'Ö')  # Büyük Ö
-    s = s.replace('\xc3\x87', 'Ç')  # Büyük Ç
-    # Sonra standart latin1→UTF-8 bozulmalarını düzelt
-    repls = {
-        'Ã\x83Â¼': 'ü', 'Ã\x84Â±': 'ı', 'Ã\x85Â\x9f': 'ş', 'Ã\x84Â\x9f': 'ğ',
-        'Ã\x83Â¶': 'ö', 'Ã\x83Â§': 'ç', 'Ã\x84Â°': 'İ', 'Ã\x83Â\x9c': 'Ü',
-        'Ã\x83Â–': 'Ö', 'Ã\x83Â‡': 'Ç', 'Ã\x85Âž': 'Ş', 'Ã\x84Â\x9e': 'Ğ',
-        'Ã¼': 'ü', 'Ã¶': 'ö', 'Ã§': 'ç', 'ÅŸ': 'ş', 'Ä±': 'ı', 'ÄŸ': 'ğ',
-        'Ãœ': 'Ü', 'Ã–': 'Ö', 'Ã‡': 'Ç', 'Åž': 'Ş', 'Ä°': 'İ', 'Äž': 'Ğ',
-        'Â': '', # Remove weird circumflex artifacts
-        'Ã': 'ı', # Catch-all for certain weird encodings
-        'Ä': 'İ'  # common at the end of words like CADDESİ
-    }
-    for old, new in repls.items():
-        s = s.replace(old, new)
-    s = re.sub(r'[\x00-\x1F\x7F-\x9F]', '', s)
-    return s.strip()
+    if s.isascii() and s.isprintable(): return s.strip()
+    parts = _non_ascii_run_re.split(s)
+    parts[1::2] = [f if (f := _fixed_runs.get(p)) is not None else _fix_run(p) for p in parts[1::2]]
+    return ''.join(parts).strip()
 
 def parse_turkish_date(date_str):
     date_str = fix_turkish(date_str).upper()
@@ -65,24 +90,85 @@ def parse_turkish_date(date_str):
     except: pass
     return None
 
+class KeywordMatcher:
+    # Kural tablosu ([(etiket, [anahtar kelimeler])]) tek bir regex'e derlenir; metin bir kez taranır.
+    # Farklı etiketlerin kelimeleri iç içe geçebiliyorsa örtüşen eşleşmeler de aranır.
+    def __init__(self, rules):
+        self.labels = [label for label, _ in rules]
+        self.index = {}
+        for i, (_, words) in enumerate(rules):
+            for w in words: self.index.setdefault(w, i)
+        pattern = self._trie_pattern(self.index)
+        if self._can_overlap(): pattern = '(?=(' + pattern + '))'
+        self.regex = re.compile(pattern)
+
+    @staticmethod
+    def _trie_pattern(words):
+        # Ortak önekler birleştirilir; regex motoru ilk harf kümesiyle hızlı tarama yapabilir
+        trie = {}
+        for w in words:
+            node = trie
+            for ch in w: node = node.setdefault(ch, {})
+            node[''] = {}
+        def build(node):
+            alts = [re.escape(ch) + build(sub) for ch, sub in sorted(node.items()) if ch]
+            if not alts: return ''
+            body = alts[0] if len(alts) == 1 else '(?:' + '|'.join(alts) + ')'
+            return '(?:' + body + ')?' if '' in node else body
+        return build(trie)
+
+    def _can_overlap(self):
+        for a, ia in self.index.items():
+            for b, ib in self.index.items():
+                if ia == ib: continue
+                if b in a or any(a.endswith(b[:k]) for k in range(1, min(len(a), len(b)))): return True
+        return False
+
+    def matches(self, text):
+        # Eşleşen etiketler kural sırasıyla
+        found = {self.index[w] for w in self.regex.findall(text)}
+        return [self.labels[i] for i in sorted(found)]
+
+    def first(self, text, default=None):
+        # Kural sırasına göre ilk eşleşen etiket
+        found = [self.index[w] for w in self.regex.findall(text)]
+        return self.labels[min(found)] if found else default
+
+AID_TYPE_RULES = [
+    ("Eğitim Yardımı", ['eğitim', 'egitim']),
+    ("Gıda Yardımı", ['gıda', 'gida']),
+    ("Kömür Yardımı", ['kömür', 'komur', 'tki', 'tkİ']),
+    ("Sağlık Yardımı", ['sağlık', 'saglik']),
+    ("Aile Yardımı", ['aile']),
+    ("Ev Eşyası Yardımı", ['eşya', 'esya']),
+    ("Kira Yardımı", ['kira']),
+    ("Nakit Yardım", ['nakit']),
+    ("Yol Yardımı", ['yol']),
+    ("Doğalgaz Desteği", ['doğalgaz', 'dogalgaz']),
+    ("SHÇEK", ['shçek', 'shcek']),
+    ("Yaşlı Aylığı", ['65']),
+    ("Engelli Aylığı", ['engelli']),
+]
+aid_type_matcher = KeywordMatcher(AID_TYPE_RULES)
+
+# Income, CentralInvestigation ve SNT cevaplarının üçü de aynı tabloyla taranır
+CENTRAL_PROGRAM_RULES = [
+    ("Engelli Aylığı", ['engelli aylığı', 'engelli ayligi', 'engelli yakını aylığı', 'engelli yakini ayligi']),
+    ("Yaşlı Aylığı", ['yaşlı aylığı', 'yasli ayligi']),
+    ("Elektrik Tüketim Desteği", ['elektrik tüketim', 'elektrik tuketim']),
+    ("Şartlı Eğitim Sağlık", ['şartlı eğitim', 'sartli egitim', 'şartlı sağlık', 'sartli saglik', 'şartlı gebelik', 'sartli gebelik', 'şartlı nakit', 'sartli nakit']),
+    ("Doğalgaz Tüketim Desteği", ['doğalgaz tüketim', 'dogalgaz tuketim', 'doğalgaz', 'dogalgaz']),
+    ("E.V.E.K", ['eşi vefat', 'esi vefat']),
+]
+central_program_matcher = KeywordMatcher(CENTRAL_PROGRAM_RULES)
+
 def map_aid_type(raw_type):
     # case-insensitive arama (.upper() Türkçe İ/I sorununa neden olduğu için)
-    t = fix_turkish(raw_type)
-    tl = t.lower()
-    if 'eğitim' in tl or 'egitim' in tl: return "Eğitim Yardımı"
-    if 'gıda' in tl or 'gida' in tl: return "Gıda Yardımı"
-    if 'kömür' in tl or 'komur' in tl or 'tki' in tl or 'tkİ' in tl: return "Kömür Yardımı"
-    if 'sağlık' in tl or 'saglik' in tl: return "Sağlık Yardımı"
-    if 'aile' in tl: return "Aile Yardımı"
-    if 'eşya' in tl or 'esya' in tl: return "Ev Eşyası Yardımı"
-    if 'kira' in tl: return "Kira Yardımı"
-    if 'nakit' in tl: return "Nakit Yardım"
-    if 'yol' in tl: return "Yol Yardımı"
-    if 'doğalgaz' in tl or 'dogalgaz' in tl: return "Doğalgaz Desteği"
-    if 'shçek' in tl or 'shcek' in tl: return "SHÇEK"
-    if '65' in tl: return "Yaşlı Aylığı"
-    if 'engelli' in tl: return "Engelli Aylığı"
-    return "Diğer"
+    return aid_type_matcher.first(fix_turkish(raw_type).lower(), "Diğer")
+
+def add_central_programs(kisi, txt):
+    for program in central_program_matcher.matches(txt.lower()):
+        if program not in kisi["central_programs"]: kisi["central_programs"].append(program)
 
 def extract_strings(binary_data):
     # \x80-\xFF dahil edildi: UTF-8 multi-byte Türkçe karakterlerin devam baytları (\x80-\xBF) korunuyor
@@ -93,16 +179,141 @@ def extract_strings(binary_data):
         except: res.append(fix_turkish(s.decode('latin1', errors='ignore')))
     return res
 
-def fetch_data(hane_no):
-    har_path = os.path.join(os.path.dirname(__file__), 'butunlesik.har')
-    if not os.path.exists(har_path): return {"error": "HAR dosyasi bulunamadi."}
+HAR_PATH = os.path.join(os.path.dirname(__file__), 'butunlesik.har')
+TEMPLATE_OPS = ['getAidSummaryOfHouseRecord', 'getIncomeTestAndSummaryInfoOfHouseRecord', 'getCentralInvestigationSummaryOfHouseRecord', 'getEntitiesWithTouchedProperties', 'getSNTSummaryOfHouseRecord']
 
-    try:
-        with open(har_path, 'r', encoding='utf-8') as f: data = json.load(f)
-    except: return {"error": "HAR hatasi."}
+SESSION_EXPIRED_ERROR = "Oturum süresi dolmuş (Session Expired). Lütfen Bütünleşik sisteme giriş yapıp yeni bir HAR dosyası indirin."
+UNAVAILABLE_ERROR = "Bütünleşik sisteme ulaşılamadı"
+
+# HAR'dan çıkarılan oturum bilgisi bu uzantıyla HAR'ın yanına yazılır
+SESSION_SUFFIX = '.session.json'
+
+# Kalıcı süreçte (worker) HAR bir kez okunur; dosya değişirse yeniden yüklenir
+_session_cache = {}
+# Keep-alive: tüm istekler aynı TLS bağlantısını kullanır
+http = requests.Session()
+
+class RateLimiter:
+    # Saniyede en fazla `rate` AMF isteği; istekler eşit aralıklarla dağıtılır
+    def __init__(self, rate):
+        self.rate = rate
+        self.interval = 1.0 / rate
+        self.lock = threading.Lock()
+        self.next_at = time.monotonic()
 
+    def wait(self):
+        with self.lock:
+            at = max(self.next_at, time.monotonic())
+            self.next_at = at + self.interval
+        delay = at - time.monotonic()
+        if delay > 0: time.sleep(delay)
+
+# Toplu modda ayarlanır (--rps); her oturum kendi sınırını alır
+RPS = None
+
+def session_rate_limiter(session):
+    if not RPS: return None
+    limiter = session.get("rate_limiter")
+    if limiter is None or limiter.rate != RPS: limiter = session["rate_limiter"] = RateLimiter(RPS)
+    return limiter
+
+# İstek başına zaman aşımı, hane başına toplam süre (0 = sınırsız) ve geçici hatalarda yeniden deneme sayısı
+TIMEOUT = float(os.environ.get('AMF_TIMEOUT', 20))
+CONNECT_TIMEOUT = 5.0
+DEADLINE = float(os.environ.get('AMF_DEADLINE', 60))
+RETRIES = int(os.environ.get('AMF_RETRIES', 2))
+# Oturum hatası alınan oturumla bu süre boyunca istek gönderilmez (HAR yenilenince yeni oturum yüklenir)
+SESSION_EXPIRED_HOLD = 60.0
+# Devre kesici: art arda bu kadar başarısız çağrıdan sonra BREAKER_COOLDOWN sn istek gönderilmez. Çağrı başına
+# (yeniden denemeler dahil) tek hata sayılır; tek hanenin 6 paralel çağrısının hepsi düşse de devre açılmaz.
+BREAKER_THRESHOLD = 10
+BREAKER_COOLDOWN = 30.0
+
+class JsonStream:
+    # Dosyadan parça parça okuyan basit JSON gezgini: nesne anahtarları ve dizi elemanları tek tek çözülür,
+    # bellekte yalnızca o an okunan değer tutulur.
+    _ws = re.compile(r'\s*')
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, f, chunk_size=1 << 16):
+        self.f, self.chunk_size = f, chunk_size
+        self.buf, self.pos, self.eof = '', 0, False
+
+    def fill(self, size):
+        # Okunmuş kısım atılır; yarım değerlerde tampon her seferinde en az iki katına çıkar (toplam iş doğrusal kalır)
+        chunk = self.f.read(max(size, self.chunk_size))
+        if not chunk: self.eof = True
+        self.buf, self.pos = self.buf[self.pos:] + chunk, 0
+
+    def peek(self):
+        while True:
+            self.pos = self._ws.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf): return self.buf[self.pos]
+            if self.eof: raise ValueError("JSON beklenmedik şekilde bitti")
+            self.fill(self.chunk_size)
+
+    def expect(self, chars):
+        ch = self.peek()
+        if ch not in chars: raise ValueError(f"JSON: {chars!r} bekleniyordu, {ch!r} bulundu")
+        self.pos += 1
+        return ch
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buf, self.pos)
+                # Tamponun sonuna kadar giden ya da ardından sayı karakteri gelen değer yarım okunmuş bir sayı olabilir
+                if self.eof or (end < len(self.buf) and self.buf[end] not in '0123456789.eE+-'):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof: raise
+            self.fill(len(self.buf) - self.pos)
+
+    def keys(self):
+        # Her anahtardan sonra çağıran değeri okumalıdır (value() ya da keys()/items())
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}': return
+
+    def items(self):
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(',]') == ']': return
+
+def iter_har_entries(har_path):
+    # HAR akış olarak okunur: log.entries elemanları tek tek döner (bellek tarayıcı çıktısının boyutuyla büyümez)
+    with open(har_path, 'r', encoding='utf-8') as f:
+        stream = JsonStream(f)
+        for key in stream.keys():
+            if key != 'log':
+                stream.value()
+                continue
+            for log_key in stream.keys():
+                if log_key == 'entries': yield from stream.items()
+                else: stream.value()
+
+def operation_key(msg):
+    # Şablon anahtarı: işlem adı; getEntitiesWithTouchedProperties için varlık sınıfı da eklenir
+    op = msg.body[0].operation
+    if op not in TEMPLATE_OPS: return None
+    return op + "_" + str(msg.body[0].body[0]).split('.')[-1] if op == 'getEntitiesWithTouchedProperties' else op
+
+def extract_session(entries):
+    # HAR'dan yalnızca gerekli olanlar: ilk şablonlar, URL, başlıklar ve çerezler
     req_url, req_headers, req_cookies, templates = None, {}, {}, {}
-    for entry in data['log']['entries']:
+    for entry in entries:
         req = entry['request']
         if 'amf' in req.get('url', '') and 'postData' in req and 'text' in req['postData']:
             text = req['postData']['text']
@@ -110,19 +321,499 @@ def fetch_data(hane_no):
             try:
                 envelope = remoting.decode(decoded)
                 for t, msg in envelope.items():
-                    op = msg.body[0].operation
-                    if op in ['getAidSummaryOfHouseRecord', 'getIncomeTestAndSummaryInfoOfHouseRecord', 'getCentralInvestigationSummaryOfHouseRecord', 'getEntitiesWithTouchedProperties', 'getSNTSummaryOfHouseRecord']:
-                        key = op + "_" + str(msg.body[0].body[0]).split('.')[-1] if op == 'getEntitiesWithTouchedProperties' else op
-                        if key not in templates: templates[key] = decoded
+                    key = operation_key(msg)
+                    if key and key not in templates: templates[key] = decoded
                 req_url = req['url']
                 for h in req['headers']:
                     if h['name'].lower() not in ['host', 'content-length']: req_headers[h['name']] = h['value']
                 for c in req['cookies']: req_cookies[c['name']] = c['value']
                 req_headers['Content-Type'] = 'application/x-amf'
             except: pass
+    if not req_url: return None
+    return {"url": req_url, "headers": req_headers, "cookies": req_cookies, "templates": templates}
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''): h.update(chunk)
+    return h.hexdigest()
+
+def read_session_artifact(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f: return json.load(f)
+    except: return None
+
+def write_session_artifact(path, artifact):
+    # Yarım yazılmış dosya okunmasın diye önce geçici dosyaya yazılır
+    try:
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f: json.dump(artifact, f)
+        os.replace(tmp, path)
+    except OSError: pass
+
+def session_from_artifact(path, artifact):
+    # Devre kesici ve sağlık kaydı oturum nesnesiyle yaşar; HAR yenilenince sıfırdan başlar
+    return {"name": os.path.basename(path), "url": artifact["url"], "headers": artifact["headers"], "cookies": artifact["cookies"],
+            "templates": {k: base64.b64decode(v) for k, v in artifact["templates"].items()},
+            "breaker": CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN), "health": SessionHealth()}
+
+def load_session_artifact(path):
+    # HAR'ı olmadan taşınan .session.json dosyası
+    try: st = os.stat(path)
+    except OSError: return {"error": "Oturum dosyasi bulunamadi."}
+    stamp = [st.st_mtime_ns, st.st_size]
+    cached = _session_cache.get(path)
+    if cached and cached[0] == stamp: return cached[1]
+    artifact = read_session_artifact(path)
+    if not artifact or "templates" not in artifact: return {"error": "Oturum dosyasi hatali."}
+    session = session_from_artifact(path, artifact)
+    _session_cache[path] = (stamp, session)
+    return session
+
+def load_session(har_path=None):
+    # Öncelik: bellek > HAR'ın yanındaki .session.json > HAR'ın kendisi.
+    # HAR değiştiğinde (mtime/boyut, aynıysa sha256) oturum dosyası yeniden üretilir.
+    har_path = har_path or HAR_PATH
+    if har_path.endswith(SESSION_SUFFIX): return load_session_artifact(har_path)
+    if not os.path.exists(har_path): return {"error": "HAR dosyasi bulunamadi."}
+    st = os.stat(har_path)
+    stamp = [st.st_mtime_ns, st.st_size]
+    cached = _session_cache.get(har_path)
+    if cached and cached[0] == stamp: return cached[1]
+
+    artifact_path = har_path + SESSION_SUFFIX
+    artifact = read_session_artifact(artifact_path)
+    if artifact and artifact.get("stamp") != stamp:
+        try: sha = file_sha256(har_path)
+        except OSError: return {"error": "HAR hatasi."}
+        if artifact.get("sha256") == sha:
+            artifact["stamp"] = stamp
+            write_session_artifact(artifact_path, artifact)
+        else: artifact = None
+
+    if not artifact:
+        try: session = extract_session(iter_har_entries(har_path))
+        except: return {"error": "HAR hatasi."}
+        if not session: return {"error": "Oturum bulunamadi."}
+        artifact = {"stamp": stamp, "sha256": file_sha256(har_path), "url": session["url"], "headers": session["headers"], "cookies": session["cookies"],
+                    "templates": {k: base64.b64encode(v).decode('ascii') for k, v in session["templates"].items()}}
+        write_session_artifact(artifact_path, artifact)
+
+    session = session_from_artifact(har_path, artifact)
+    _session_cache[har_path] = (stamp, session)
+    return session
+
+# Birden fazla oturum: AMF_SESSIONS/--sessions klasöründeki HAR'lar (ve HAR'ı olmayan .session.json dosyaları).
+# Klasör her seçimde yeniden listelenir; eklenen/yenilenen HAR çalışan worker'a da katılır.
+SESSION_DIR = os.environ.get('AMF_SESSIONS')
+DISPATCH = os.environ.get('AMF_DISPATCH', 'least-loaded')
+
+def session_paths():
+    if not SESSION_DIR: return [HAR_PATH]
+    try: names = sorted(os.listdir(SESSION_DIR))
+    except OSError: return []
+    hars = [n for n in names if n.endswith('.har')]
+    artifacts = [n for n in names if n.endswith(SESSION_SUFFIX) and n[:-len(SESSION_SUFFIX)] not in hars]
+    return [os.path.join(SESSION_DIR, n) for n in hars + artifacts]
+
+def encode_request(templates, key, hane_no):
+    env = remoting.decode(templates[key])
+    msg = env.items()[0][1]
+    if key.startswith('getEntitiesWithTouchedProperties'):
+        if len(msg.body[0].body) > 2: msg.body[0].body[2][0] = hane_no
+    else: msg.body[0].body = [hane_no]
+    return remoting.encode(env).getvalue()
+
+def amf3_int_bytes(n):
+    # AMF3 tamsayı (0x04 + U29); 29 bit dışındaki değerler double (0x05) olarak yazılır
+    if not -0x10000000 <= n < 0x10000000: return b'\x05' + struct.pack('>d', n)
+    n &= 0x1FFFFFFF
+    if n < 0x80: return bytes((0x04, n))
+    if n < 0x4000: return bytes((0x04, n >> 7 | 0x80, n & 0x7F))
+    if n < 0x200000: return bytes((0x04, n >> 14 | 0x80, n >> 7 & 0x7F | 0x80, n & 0x7F))
+    return bytes((0x04, n >> 22 | 0x80, n >> 15 & 0x7F | 0x80, n >> 8 & 0x7F | 0x80, n & 0xFF))
+
+# (şablon, değer işaretçisi, değer uzunluğu) -> (önek, sonek); None = bu şablona yama yapılamaz
+_layouts = {}
+
+def find_layout(templates, key, hane_no, value):
+    # Şablon aynı kodlama sınıfındaki iki farklı değerle tam yoldan kodlanır. Değer çıktıda tek bir yerde
+    # geçiyorsa ve ikinci değer de aynı önek/sonek ile birebir üretiliyorsa bayt düzeni güvenlidir.
+    probe = hane_no ^ 1
+    probe_value = amf3_int_bytes(probe)
+    if len(probe_value) != len(value) or probe_value[0] != value[0]: return None
+    try:
+        full = encode_request(templates, key, hane_no)
+        full_probe = encode_request(templates, key, probe)
+    except: return None
+    i = full.find(value)
+    if i < 0 or full.find(value, i + 1) >= 0: return None
+    prefix, suffix = full[:i], full[i + len(value):]
+    if prefix + probe_value + suffix != full_probe: return None
+    return prefix, suffix
+
+def build_request(templates, key, hane_no):
+    # Şablon yalnızca ilk istekte çözülür; sonrakilerde hane_no'nun baytları araya eklenir
+    if type(hane_no) is not int: return encode_request(templates, key, hane_no)
+    value = amf3_int_bytes(hane_no)
+    layout_key = (templates[key], value[0], len(value))
+    if layout_key not in _layouts: _layouts[layout_key] = find_layout(templates, key, hane_no, value)
+    layout = _layouts[layout_key]
+    if layout is None: return encode_request(templates, key, hane_no)
+    return layout[0] + value + layout[1]
+
+def ms(seconds):
+    return round(seconds * 1000, 2)
+
+def session_is_expired(session):
+    at = session.get("expired_at")
+    return at is not None and time.monotonic() - at < SESSION_EXPIRED_HOLD
+
+def post_amf(session, key, hane_no, timings=None, deadline=None, cancel=None):
+    # Geçici hatalar yeniden denenir. Oturum hatası alınınca oturum işaretlenir (diğer sorgular da istek göndermez)
+    # ve bu hanenin kalan çağrıları cancel ile durdurulur.
+    # timings verilirse aşama süreleri (ms) içine yazılır: kuyrukta bekleme, istek kodlama, hız sınırı, ağ, deneme sayısı
+    t0 = time.perf_counter()
+    data = build_request(session["templates"], key, hane_no)
+    t1 = time.perf_counter()
+    rate_wait, attempts = 0.0, []
+
+    def send(timeout):
+        nonlocal rate_wait
+        if session_is_expired(session): raise SessionExpiredError(SESSION_EXPIRED_ERROR)
+        limiter = session_rate_limiter(session)
+        if limiter:
+            w0 = time.perf_counter()
+            limiter.wait()
+            rate_wait += time.perf_counter() - w0
+        return http.post(session["url"], headers=session["headers"], cookies=session["cookies"], data=data,
+                         timeout=(min(CONNECT_TIMEOUT, timeout), timeout), verify=False, allow_redirects=False)
+
+    try:
+        resp = call_with_retry(send, TIMEOUT, retries=RETRIES, deadline=deadline, breaker=session.get("breaker"), cancel=cancel, attempts=attempts)
+    finally:
+        if timings is not None:
+            if "submitted_at" in timings: timings["queue_ms"] = ms(t0 - timings.pop("submitted_at"))
+            timings["encode_ms"] = ms(t1 - t0)
+            if RPS: timings["rate_wait_ms"] = ms(rate_wait)
+            timings["request_ms"] = ms(time.perf_counter() - t1 - rate_wait)
+            if len(attempts) > 1: timings["attempts"] = len(attempts)
+    if session_expired(resp):
+        session["expired_at"] = time.monotonic()
+        if cancel is not None: cancel.set()
+    return resp
+
+# 1. Hane Ziyaret Notu & Isimler
+def parse_income(kisi, resp):
+    txt = fix_turkish(resp.content.decode('latin1', errors='ignore'))
+
+    # Ziyaret notları
+    match = re.search(r'Ziyareti[^<]*</b>(.*?)<b>', txt, re.DOTALL | re.IGNORECASE)
+    if match:
+        desc = match.group(1).strip()
+        kisi["household_description"] = desc
+        # Toplam Gelir
+        m_toplam = re.search(r'TOPLAM\s*:\s*([\d\.]+[,\d]*)', desc, re.IGNORECASE)
+        if m_toplam: kisi["household_income"] = m_toplam.group(1).replace('.', '').replace(',', '.')
+        # Kişibaşı Gelir
+        m_kisi = re.search(r'K[\wİŞ]+\s*BA[\wŞI]+\s+AYLIK[^:]*:\s*([\d\.]+[,\d]*)', desc, re.IGNORECASE)
+        if m_kisi: kisi["per_capita_income"] = m_kisi.group(1).replace('.', '').replace(',', '.')
+
+    # Merkezi Yardım Tespiti (Bu servisten de kontrol et)
+    add_central_programs(kisi, txt)
+
+def parse_central_investigation(kisi, resp):
+    txt = fix_turkish(resp.content.decode('latin1', errors='ignore'))
+    add_central_programs(kisi, txt)
+
+    # Sosyal Güvence tespiti
+    sg_matches = re.findall(r'Sa[ğg]l[ıi]k G[üu]vencesi\((.*?)\)', txt, re.IGNORECASE)
+    for sg in sg_matches:
+        sg_lower = sg.lower()
+        is_kendisi = 'kendisi' in sg_lower or 'bilinmiyor' in sg_lower
+
+        val = ""
+        if '60/c3' in sg_lower and '65 yaş' in sg_lower: val = "65 Maaşı"
+        elif '60/c1' in sg_lower and 'yeşilkart' in sg_lower: val = "G0"
+        elif '60/g' in sg_lower and 'isteğe bağlı' in sg_lower: val = "G1"
+        elif 'yaşlılık' in sg_lower or 'ölüm çocuk' in sg_lower: val = "Emekli"
+        elif 'zorunlu sigortalılar' in sg_lower: val = "SGK"
+
+        if val:
+            if is_kendisi or not kisi.get("social_security"):
+                kisi["social_security"] = val
+            if is_kendisi:
+                break
+
+    b_tags = re.findall(r'<b>(.*?)</b>', txt, re.IGNORECASE)
+    member_count = 0
+    child_count = 0
+    for i in range(len(b_tags)):
+        tag = b_tags[i].strip()
+        tag_lower = tag.lower()
+        if len(tag) < 15:
+            is_role = False
+            if re.search(r'KEND', tag, re.I):
+                is_role = True
+                if i >= 2: kisi["full_name"] = b_tags[i-2].strip()
+                elif i > 0: kisi["full_name"] = b_tags[i-1].strip()
+            elif re.search(r'^E.{0,10}i\)?$', tag, re.I):
+                is_role = True
+                if i >= 2: kisi["spouse_name"] = b_tags[i-2].strip()
+            elif any(x in tag_lower for x in ['oğlu', 'oglu', 'kızı', 'kizi']):
+                is_role = True
+                child_count += 1
+            elif any(x in tag_lower for x in ['annesi', 'babası', 'babasi', 'kardeşi', 'kardesi', 'gelini', 'damadı', 'damadi', 'torunu', 'kayın', 'kayin']):
+                is_role = True
+            if is_role: member_count += 1
+    kisi["household_size"] = member_count
+    kisi["children_count"] = child_count
+
+def parse_snt(kisi, resp):
+    txt = fix_turkish(resp.content.decode('latin1', errors='ignore'))
+    add_central_programs(kisi, txt)
+
+TCKN_RE = re.compile(r'^[1-9][0-9]{10}$')
+PHONE_RE = re.compile(r'^05[0-9]{9}$')
+IGNORED_PHONE = '05305756968'
+
+def as_dict(obj):
+    if not obj: return {}
+    return obj if isinstance(obj, dict) else getattr(obj, '__dict__', {})
+
+def decode_records(content):
+    # AMF cevabı bir kez çözülür; üst düzey kayıtlar dict olarak döner
+    records = []
+    for t, mess in remoting.decode(content).items():
+        data = mess.body.body if hasattr(mess.body, 'body') else mess.body
+        if isinstance(data, (list, pyamf.flex.ArrayCollection)):
+            records.extend(as_dict(obj) for obj in data)
+    return records
+
+def valid_phone(value):
+    value = str(value) if value else ''
+    return value if PHONE_RE.match(value) and value != IGNORED_PHONE else ''
+
+def format_address(a):
+    # Adres formatla: "MAH. BİNA No: DIS/IC İLÇE/İL"
+    mahalle = fix_turkish(str(a['mahalle'])) if a.get('mahalle') else ''
+    csmb = fix_turkish(str(a['csmb'])) if a.get('csmb') else ''  # Bina/Site/Küme adı
+    dis_kapi = str(a['disKapiNo']) if a.get('disKapiNo') else ''
+    ic_kapi = str(a['icKapiNo']) if a.get('icKapiNo') else ''
+    koy = fix_turkish(str(a['koy'])) if a.get('koy') else ''
+
+    # İlçe ve İl bilgisi
+    district = as_dict(a.get('district'))
+    city = as_dict(district.get('city'))
+    ilce = fix_turkish(str(district['districtName'])) if district.get('districtName') else ''
+    il = fix_turkish(str(city['cityName'])) if city.get('cityName') else ''
+
+    parts = []
+    if mahalle: parts.append(mahalle)
+    if csmb: parts.append(csmb)
+    if koy and not mahalle: parts.append(koy)
+    if dis_kapi:
+        no_str = f"No: {dis_kapi}"
+        if ic_kapi: no_str += f"/{ic_kapi}"
+        parts.append(no_str)
+    if ilce and il: parts.append(f"{ilce}/{il}")
+    elif ilce: parts.append(ilce)
+    elif il: parts.append(il)
+    return ' '.join(parts)
+
+def extract_house_record(records):
+    # HouseRecord kayıtlarından yalnızca gereken alanlar; bulunamayanlar boş kalır
+    info = {"national_id": "", "phone": "", "address": ""}
+    for d in records:
+        owner = as_dict(d.get('owner'))
+        # Telefon: önce HouseRecord, sonra hane sahibi seviyesinde
+        phone = valid_phone(d.get('mobilePhoneNumber') or d.get('phoneNumber')) or valid_phone(owner.get('mobilePhoneNumber') or owner.get('phoneNumber'))
+        if phone: info["phone"] = phone
+        # TC: hane sahibinin tcKimlikNo alanı (anne/baba/eş kimlik numaraları da aynı biçimde olduğundan ada göre okunur)
+        tckn = owner.get('tcKimlikNo')
+        if isinstance(tckn, (str, int)) and not isinstance(tckn, bool) and TCKN_RE.match(str(tckn)): info["national_id"] = str(tckn)
+        address = format_address(as_dict(owner.get('currentAddress')))
+        if address: info["address"] = address
+    return info
+
+def scan_identifiers(content):
+    # Yedek yol: ikili cevaptaki metinlerden son TC ve telefon biçimli değerler
+    national_id, phone = '', ''
+    for s in extract_strings(content):
+        s = s.strip()
+        if TCKN_RE.match(s): national_id = s
+        elif valid_phone(s): phone = s
+    return national_id, phone
+
+# 2. Dogum Tarihi
+def parse_citizen(kisi, resp):
+    if not kisi["full_name"]: return
+    bulunan = kisi["full_name"].upper().replace('I','İ')
+    for d in decode_records(resp.content):
+        o_name = (d.get('name', '') + ' ' + d.get('surname', '')).upper().replace('I','İ')
+        if bulunan[:8] in o_name or o_name[:8] in bulunan:
+            if d.get('birthdate'): kisi["birth_date"] = d.get('birthdate').strftime('%Y-%m-%d'); break
+
+# 3. Adres & TC & Telefon (Yapısal AMF ayrıştırma)
+def parse_house_record(kisi, resp):
+    # Cevap bir kez çözülür; ikili metin taraması yalnızca TC/telefon yapısal alanlarda yoksa yapılır
+    try: info = extract_house_record(decode_records(resp.content))
+    except: info = {"national_id": "", "phone": "", "address": ""}
+    if not (info["national_id"] and info["phone"]):
+        national_id, phone = scan_identifiers(resp.content)
+        info["national_id"] = info["national_id"] or national_id
+        info["phone"] = info["phone"] or phone
+    for k, v in info.items():
+        if v: kisi[k] = v
+
+# 4. Yardımlar - <b> etiketlerine göre satırlara böl
+def parse_aid_summary(kisi, resp):
+    txt = fix_turkish(resp.content.decode('latin1', errors='ignore'))
+
+    results = []
+    # Veri tek satırda geliyor: <b>TÜR</b>   TARİH   DURUM   MİKTARTL<b>TÜR</b>...
+    # <b> ile bölerek her yardımı ayrı satır olarak ele al
+    segments = re.split(r'<b>', txt)
+    for seg in segments:
+        if '</b>' not in seg: continue
+        # seg = "Diğer Eğitim Yardımı</b>   20 Şubat 2026   Tamamlandı   2.000,00TL"
+        seg_clean = seg.replace('</b>', '  ')  # </b> yerine boşluk koy
+        parts = [p.strip() for p in seg_clean.split('   ') if p.strip()]
+        # parts = ["Diğer Eğitim Yardımı", "20 Şubat 2026", "Tamamlandı", "2.000,00TL"]
+        if len(parts) >= 4:
+            aid_type = map_aid_type(parts[0])
+            d_iso = parse_turkish_date(parts[1])
+            if not d_iso: continue
+            # Miktar: son elemandan TL'yi temizle
+            amt = parts[3].replace('TL', '').replace(' ', '').strip()
+            results.append({"type": aid_type, "date": d_iso, "amount": amt})
+
+    kisi["assistance_records"] = sorted(results, key=lambda x: x['date'], reverse=True)[:3]
+
+# Sıra sonuçların birleştirilme sırasıdır: central_programs bu sırayla dolar,
+# Citizen ise CentralInvestigation'dan gelen full_name'e ihtiyaç duyar.
+OPERATIONS = [
+    ('getIncomeTestAndSummaryInfoOfHouseRecord', parse_income),
+    ('getCentralInvestigationSummaryOfHouseRecord', parse_central_investigation),
+    ('getSNTSummaryOfHouseRecord', parse_snt),
+    ('getEntitiesWithTouchedProperties_Citizen', parse_citizen),
+    ('getEntitiesWithTouchedProperties_HouseRecord', parse_house_record),
+    ('getAidSummaryOfHouseRecord', parse_aid_summary),
+]
+
+# Çıktı alanı -> gereken işlemler. Yalnızca istenen alanların işlemleri çalıştırılır.
+FIELD_OPERATIONS = {
+    "full_name": ['getCentralInvestigationSummaryOfHouseRecord'],
+    "spouse_name": ['getCentralInvestigationSummaryOfHouseRecord'],
+    "household_size": ['getCentralInvestigationSummaryOfHouseRecord'],
+    "children_count": ['getCentralInvestigationSummaryOfHouseRecord'],
+    "social_security": ['getCentralInvestigationSummaryOfHouseRecord'],
+    "birth_date": ['getCentralInvestigationSummaryOfHouseRecord', 'getEntitiesWithTouchedProperties_Citizen'],
+    "national_id": ['getEntitiesWithTouchedProperties_HouseRecord'],
+    "phone": ['getEntitiesWithTouchedProperties_HouseRecord'],
+    "address": ['getEntitiesWithTouchedProperties_HouseRecord'],
+    "household_description": ['getIncomeTestAndSummaryInfoOfHouseRecord'],
+    "household_income": ['getIncomeTestAndSummaryInfoOfHouseRecord'],
+    "per_capita_income": ['getIncomeTestAndSummaryInfoOfHouseRecord'],
+    "central_programs": ['getIncomeTestAndSummaryInfoOfHouseRecord', 'getCentralInvestigationSummaryOfHouseRecord', 'getSNTSummaryOfHouseRecord'],
+    "assistance_records": ['getAidSummaryOfHouseRecord'],
+}
+
+def parse_fields(fields):
+    # "a,b" ya da ["a", "b"]; None/boş = tüm alanlar. Bilinmeyen alan ValueError verir.
+    if not fields: return None
+    if isinstance(fields, str): fields = fields.split(',')
+    fields = [f.strip() for f in fields if f.strip()]
+    unknown = [f for f in fields if f not in FIELD_OPERATIONS]
+    if unknown: raise ValueError(f"Bilinmeyen alan: {', '.join(unknown)}")
+    return fields or None
+
+def select_fields(kisi, fields):
+    if not fields or "error" in kisi: return kisi
+    return {"file_no": kisi["file_no"], **{f: kisi[f] for f in fields}}
+
+def session_expired(resp):
+    # Yönlendirmeler izlenmez: giriş sayfasına yönlendirme oturum hatası sayılır
+    return b"Session Expired" in resp.content or b"Authentication Failed" in resp.content or resp.status_code in [301, 302, 303, 307, 308, 401, 403]
+
+def amf_fault_message(content):
+    # onStatus cevabının hata metni (ErrorMessage.faultString); çözülemezse None
+    try:
+        for t, mess in remoting.decode(content).items():
+            body = mess.body
+            text = getattr(body, 'faultString', None) or getattr(body, 'faultDetail', None) or as_dict(body).get('description')
+            if text: return fix_turkish(str(text))
+    except Exception: pass
+    return None
+
+def amf_response_error(content):
+    # HTTP 200 ile gelen AMF hatası ya da AMF olmayan cevap için hata metni, geçerli cevapta None.
+    # Tek mesajlı, başlıksız cevapta (olağan durum) yalnızca zarfın başı okunur: hedef "/n/onResult" olmalı.
+    try:
+        version, header_count = struct.unpack_from('>HH', content, 0)
+        if version not in (0, 3): return "AMF cevabı değil"
+        if header_count == 0:
+            body_count, target_len = struct.unpack_from('>HH', content, 4)
+            target = content[8:8 + target_len]
+            if body_count == 1 and len(target) == target_len:
+                if target.endswith(b'/onResult'): return None
+                if target.endswith(b'/onStatus'): return "AMF hatası: " + (amf_fault_message(content) or "sunucu hata döndürdü")
+                return f"Beklenmeyen AMF hedefi: {target.decode('latin1')}"
+        # Başlıklı ya da çok mesajlı cevap: tamamı çözülür
+        messages = list(remoting.decode(content).items())
+    except struct.error:
+        return "AMF cevabı eksik"
+    except Exception as e:
+        return f"AMF cevabı çözülemedi: {type(e).__name__}"
+    if not messages: return "AMF cevabı boş"
+    for t, mess in messages:
+        if getattr(mess, 'status', remoting.STATUS_OK) != remoting.STATUS_OK:
+            return "AMF hatası: " + (amf_fault_message(content) or "sunucu hata döndürdü")
+    return None
+
+# İstekler birbirinden bağımsız gönderilir; hane başına süre en yavaş çağrı kadar olur
+_executor = ThreadPoolExecutor(max_workers=len(OPERATIONS))
+
+def describe_error(stage, e):
+    return {"stage": stage, "error": f"{type(e).__name__}: {e}"}
+
+session_pool = SessionPool(session_paths, load_session, session_is_expired, SESSION_EXPIRED_ERROR, mode=DISPATCH)
+
+def raw_digests(raw):
+    # İşlem bazında ham cevap özeti ({anahtar: sha256})
+    return {k: hashlib.sha256(v).hexdigest() for k, v in raw.items()}
+
+def fetch_data(hane_no, executor=None, raw=None, fields=None, metrics=None, previous_raw=None):
+    # raw bir dict ise her işlemin ham AMF cevabı içine yazılır; fields verilirse yalnızca gereken işlemler çalışır.
+    # metrics bir dict ise oturum seçimi, işlem bazında süre/bayt/durum ve başarısız işlemler içine yazılır.
+    # previous_raw (raw_digests çıktısı) verilirse ve tüm ham cevaplar aynıysa ayrıştırma yapılmaz, {"file_no", "unchanged": True} döner.
+    # Seçilen oturumun süresi dolmuşsa hane havuzdaki sıradaki oturumla yeniden sorgulanır; süre sınırı (DEADLINE) tüm denemeler için tektir.
+    executor = executor or _executor
+    fields = parse_fields(fields)
+    deadline = Deadline(DEADLINE)
+    tried = []
+    while True:
+        t0 = time.perf_counter()
+        path, session = session_pool.acquire(exclude=tried)
+        if metrics is not None:
+            metrics["session_ms"] = ms(time.perf_counter() - t0)
+            if tried: metrics["expired_sessions"] = [os.path.basename(p) for p in tried]
+        if path is None: return session
+        if metrics is not None: metrics["session"] = session["name"]
+        t0 = time.perf_counter()
+        res, failed = None, {}
+        try: res = fetch_with_session(session, hane_no, executor, raw, fields, metrics, failed, deadline, previous_raw)
+        finally:
+            ok = res is not None and "error" not in res and not failed
+            session_pool.release(session, ok, ms(time.perf_counter() - t0))
+        if res.get("error") != SESSION_EXPIRED_ERROR or deadline.expired(): return res
+        tried.append(path)
+        if raw is not None: raw.clear()
+
+def fetch_with_session(session, hane_no, executor, raw, fields, metrics, failed, deadline, previous_raw=None):
+    needed = {op for f in fields for op in FIELD_OPERATIONS[f]} if fields else None
+    if session_is_expired(session): return {"error": SESSION_EXPIRED_ERROR}
 
-    if not req_url: return {"error": "Oturum bulunamadi."}
-    
     kisi = {
         "file_no": hane_no, "full_name": "", "national_id": "", "birth_date": "",
         "phone": "", "spouse_name": "", "address": "", "household_description": "",
@@ -132,255 +823,327 @@ def fetch_data(hane_no):
         "assistance_records": []
     }
 
-    # 1. Hane Ziyaret Notu & Isimler
-    if 'getIncomeTestAndSummaryInfoOfHouseRecord' in templates:
-        try:
-            env = remoting.decode(templates['getIncomeTestAndSummaryInfoOfHouseRecord'])
-            env.items()[0][1].body[0].body = [hane_no]
-            resp = requests.post(req_url, headers=req_headers, cookies=req_cookies, data=remoting.encode(env).getvalue(), verify=False)
-            txt = fix_turkish(resp.content.decode('latin1', errors='ignore'))
-            
-            # Oturum kontrolü
-            if "Session Expired" in txt or "Authentication Failed" in txt or resp.status_code in [301, 302, 401, 403]:
-                return {"error": "Oturum süresi dolmuş (Session Expired). Lütfen Bütünleşik sisteme giriş yapıp yeni bir HAR dosyası indirin."}
-                
-            # Ziyaret notları
-            match = re.search(r'Ziyareti[^<]*</b>(.*?)<b>', txt, re.DOTALL | re.IGNORECASE)
-            if match:
-                desc = match.group(1).strip()
-                kisi["household_description"] = desc
-                # Toplam Gelir
-                m_toplam = re.search(r'TOPLAM\s*:\s*([\d\.]+[,\d]*)', desc, re.IGNORECASE)
-                if m_toplam: kisi["household_income"] = m_toplam.group(1).replace('.', '').replace(',', '.')
-                # Kişibaşı Gelir
-                m_kisi = re.search(r'K[\wİŞ]+\s*BA[\wŞI]+\s+AYLIK[^:]*:\s*([\d\.]+[,\d]*)', desc, re.IGNORECASE)
-                if m_kisi: kisi["per_capita_income"] = m_kisi.group(1).replace('.', '').replace(',', '.')
-            
-            # Merkezi Yardım Tespiti (Bu servisten de kontrol et)
-            txt_lower = txt.lower()
-            if any(x in txt_lower for x in ['engelli aylığı', 'engelli ayligi', 'engelli yakını aylığı', 'engelli yakini ayligi']):
-                if "Engelli Aylığı" not in kisi["central_programs"]: kisi["central_programs"].append("Engelli Aylığı")
-            if any(x in txt_lower for x in ['yaşlı aylığı', 'yasli ayligi']):
-                if "Yaşlı Aylığı" not in kisi["central_programs"]: kisi["central_programs"].append("Yaşlı Aylığı")
-            if any(x in txt_lower for x in ['elektrik tüketim', 'elektrik tuketim']):
-                if "Elektrik Tüketim Desteği" not in kisi["central_programs"]: kisi["central_programs"].append("Elektrik Tüketim Desteği")
-            if any(x in txt_lower for x in ['şartlı eğitim', 'sartli egitim', 'şartlı sağlık', 'sartli saglik', 'şartlı gebelik', 'sartli gebelik']):
-                if "Şartlı Eğitim Sağlık" not in kisi["central_programs"]: kisi["central_programs"].append("Şartlı Eğitim Sağlık")
-            if any(x in txt_lower for x in ['doğalgaz tüketim', 'dogalgaz tuketim']):
-                if "Doğalgaz Tüketim Desteği" not in kisi["central_programs"]: kisi["central_programs"].append("Doğalgaz Tüketim Desteği")
-            if any(x in txt_lower for x in ['eşi vefat', 'esi vefat']):
-                if "E.V.E.K" not in kisi["central_programs"]: kisi["central_programs"].append("E.V.E.K")
-        except: pass
-
-    if 'getCentralInvestigationSummaryOfHouseRecord' in templates:
-        try:
-            env = remoting.decode(templates['getCentralInvestigationSummaryOfHouseRecord'])
-            env.items()[0][1].body[0].body = [hane_no]
-            resp = requests.post(req_url, headers=req_headers, cookies=req_cookies, data=remoting.encode(env).getvalue(), verify=False)
-            txt = fix_turkish(resp.content.decode('latin1', errors='ignore'))
-            txt_lower = txt.lower()
-            if any(x in txt_lower for x in ['engelli aylığı', 'engelli ayligi', 'engelli yakını aylığı', 'engelli yakini ayligi']): 
-                if "Engelli Aylığı" not in kisi["central_programs"]: kisi["central_programs"].append("Engelli Aylığı")
-            if any(x in txt_lower for x in ['yaşlı aylığı', 'yasli ayligi']):
-                if "Yaşlı Aylığı" not in kisi["central_programs"]: kisi["central_programs"].append("Yaşlı Aylığı")
-            if any(x in txt_lower for x in ['elektrik tüketim', 'elektrik tuketim']):
-                if "Elektrik Tüketim Desteği" not in kisi["central_programs"]: kisi["central_programs"].append("Elektrik Tüketim Desteği")
-            if any(x in txt_lower for x in ['şartlı eğitim', 'sartli egitim', 'şartlı sağlık', 'sartli saglik', 'şartlı gebelik', 'sartli gebelik', 'şartlı nakit', 'sartli nakit']):
-                if "Şartlı Eğitim Sağlık" not in kisi["central_programs"]: kisi["central_programs"].append("Şartlı Eğitim Sağlık")
-            if any(x in txt_lower for x in ['doğalgaz tüketim', 'dogalgaz tuketim', 'doğalgaz', 'dogalgaz']):
-                if "Doğalgaz Tüketim Desteği" not in kisi["central_programs"]: kisi["central_programs"].append("Doğalgaz Tüketim Desteği")
-            if any(x in txt_lower for x in ['eşi vefat', 'esi vefat']):
-                if "E.V.E.K" not in kisi["central_programs"]: kisi["central_programs"].append("E.V.E.K")
-
-            # Sosyal Güvence tespiti
-            sg_matches = re.findall(r'Sa[ğg]l[ıi]k G[üu]vencesi\((.*?)\)', txt, re.IGNORECASE)
-            for sg in sg_matches:
-                sg_lower = sg.lower()
-                is_kendisi = 'kendisi' in sg_lower or 'bilinmiyor' in sg_lower
-                
-                val = ""
-                if '60/c3' in sg_lower and '65 yaş' in sg_lower: val = "65 Maaşı"
-                elif '60/c1' in sg_lower and 'yeşilkart' in sg_lower: val = "G0"
-                elif '60/g' in sg_lower and 'isteğe bağlı' in sg_lower: val = "G1"
-                elif 'yaşlılık' in sg_lower or 'ölüm çocuk' in sg_lower: val = "Emekli"
-                elif 'zorunlu sigortalılar' in sg_lower: val = "SGK"
-                
-                if val:
-                    if is_kendisi or not kisi.get("social_security"):
-                        kisi["social_security"] = val
-                    if is_kendisi:
-                        break
-
-            b_tags = re.findall(r'<b>(.*?)</b>', txt, re.IGNORECASE)
-            member_count = 0
-            child_count = 0
-            for i in range(len(b_tags)):
-                tag = b_tags[i].strip()
-                tag_lower = tag.lower()
-                if len(tag) < 15:
-                    is_role = False
-                    if re.search(r'KEND', tag, re.I):
-                        is_role = True
-                        if i >= 2: kisi["full_name"] = b_tags[i-2].strip()
-                        elif i > 0: kisi["full_name"] = b_tags[i-1].strip()
-                    elif re.search(r'^E.{0,10}i\)?$', tag, re.I):
-                        is_role = True
-                        if i >= 2: kisi["spouse_name"] = b_tags[i-2].strip()
-                    elif any(x in tag_lower for x in ['oğlu', 'oglu', 'kızı', 'kizi']):
-                        is_role = True
-                        child_count += 1
-                    elif any(x in tag_lower for x in ['annesi', 'babası', 'babasi', 'kardeşi', 'kardesi', 'gelini', 'damadı', 'damadi', 'torunu', 'kayın', 'kayin']):
-                        is_role = True
-                    if is_role: member_count += 1
-            kisi["household_size"] = member_count
-            kisi["children_count"] = child_count
-        except: pass
-
-    if 'getSNTSummaryOfHouseRecord' in templates:
-        try:
-            env = remoting.decode(templates['getSNTSummaryOfHouseRecord'])
-            env.items()[0][1].body[0].body = [hane_no]
-            resp = requests.post(req_url, headers=req_headers, cookies=req_cookies, data=remoting.encode(env).getvalue(), verify=False)
-            txt = fix_turkish(resp.content.decode('latin1', errors='ignore'))
-            txt_lower = txt.lower()
-            if any(x in txt_lower for x in ['engelli aylığı', 'engelli ayligi', 'engelli yakını aylığı', 'engelli yakini ayligi']):
-                if "Engelli Aylığı" not in kisi["central_programs"]: kisi["central_programs"].append("Engelli Aylığı")
-            if any(x in txt_lower for x in ['yaşlı aylığı', 'yasli ayligi']):
-                if "Yaşlı Aylığı" not in kisi["central_programs"]: kisi["central_programs"].append("Yaşlı Aylığı")
-            if any(x in txt_lower for x in ['elektrik tüketim', 'elektrik tuketim']):
-                if "Elektrik Tüketim Desteği" not in kisi["central_programs"]: kisi["central_programs"].append("Elektrik Tüketim Desteği")
-            if any(x in txt_lower for x in ['şartlı eğitim', 'sartli egitim', 'şartlı sağlık', 'sartli saglik', 'şartlı gebelik', 'sartli gebelik', 'şartlı nakit', 'sartli nakit']):
-                if "Şartlı Eğitim Sağlık" not in kisi["central_programs"]: kisi["central_programs"].append("Şartlı Eğitim Sağlık")
-            if any(x in txt_lower for x in ['doğalgaz tüketim', 'dogalgaz tuketim', 'doğalgaz', 'dogalgaz']):
-                if "Doğalgaz Tüketim Desteği" not in kisi["central_programs"]: kisi["central_programs"].append("Doğalgaz Tüketim Desteği")
-            if any(x in txt_lower for x in ['eşi vefat', 'esi vefat']):
-                if "E.V.E.K" not in kisi["central_programs"]: kisi["central_programs"].append("E.V.E.K")
-        except: pass
-
-    # 2. Dogum Tarihi
-    if kisi["full_name"] and 'getEntitiesWithTouchedProperties_Citizen' in templates:
-        try:
-            env = remoting.decode(templates['getEntitiesWithTouchedProperties_Citizen'])
-            msg = env.items()[0][1]
-            if len(msg.body[0].body) > 2: msg.body[0].body[2][0] = hane_no
-            resp = requests.post(req_url, headers=req_headers, cookies=req_cookies, data=remoting.encode(env).getvalue(), verify=False)
-            resp_env = remoting.decode(resp.content)
-            bulunan = kisi["full_name"].upper().replace('I','İ')
-            for t, mess in resp_env.items():
-                data = mess.body.body if hasattr(mess.body, 'body') else mess.body
-                if isinstance(data, (list, pyamf.flex.ArrayCollection)):
-                    for obj in data:
-                        d = obj if isinstance(obj, dict) else getattr(obj, '__dict__', {})
-                        o_name = (d.get('name', '') + ' ' + d.get('surname', '')).upper().replace('I','İ')
-                        if bulunan[:8] in o_name or o_name[:8] in bulunan:
-                            if d.get('birthdate'): kisi["birth_date"] = d.get('birthdate').strftime('%Y-%m-%d'); break
-        except: pass
-
-    # 3. Adres & TC & Telefon (Yapısal AMF ayrıştırma)
-    if 'getEntitiesWithTouchedProperties_HouseRecord' in templates:
+    # Başarısız işlemler sonucu durdurmaz (ilgili alanlar boş kalır) ama nedenleriyle kaydedilir.
+    # Worker thread'leri kendi timings dict'ine yazar; metrics'e yalnızca tamamlanan işlemler kopyalanır.
+    operations, timings = {}, {}
+    if metrics is not None: metrics["operations"], metrics["failed"] = operations, failed
+    cancel = threading.Event()
+    futures = {}
+    for key, _ in OPERATIONS:
+        if key not in session["templates"] or (needed is not None and key not in needed): continue
+        if metrics is not None: timings[key] = {"submitted_at": time.perf_counter()}
+        futures[executor.submit(post_amf, session, key, hane_no, timings.get(key), deadline, cancel)] = key
+
+    # Cevaplar geldikçe kontrol edilir: oturum hatasında ya da süre sınırında kalan çağrılar beklenmez
+    responses, pending = {}, set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+        if not done:
+            for f in pending: failed[futures[f]] = {"stage": "deadline", "error": f"{DEADLINE:g} sn içinde cevap gelmedi"}
+            break
+        for f in done:
+            key = futures[f]
+            try: resp = f.result()
+            except SessionExpiredError: resp = None
+            except Exception as e:
+                failed[key] = describe_error("request", e)
+                continue
+            if resp is not None and metrics is not None:
+                operations[key] = {**timings[key], "status": resp.status_code, "bytes": len(resp.content)}
+            if resp is None or session_expired(resp):
+                cancel.set()
+                for p in pending: p.cancel()
+                if metrics is not None: metrics["cancelled"] = sorted(futures[p] for p in pending)
+                return {"error": SESSION_EXPIRED_ERROR}
+            if resp.status_code >= 400:
+                failed[key] = {"stage": "request", "error": f"HTTP {resp.status_code}"}
+                continue
+            # AMF hatası ya da bozuk cevap boş veri gibi ayrıştırılmaz
+            error = amf_response_error(resp.content)
+            if error:
+                failed[key] = {"stage": "response", "error": error}
+                continue
+            responses[key] = resp
+    if pending:
+        cancel.set()
+        for f in pending: f.cancel()
+    if futures and not responses:
+        # Devre kesici/iptal kaynaklı olanlar yerine asıl hata gösterilir
+        reasons = [f["error"] for f in failed.values()]
+        reason = next((r for r in reasons if not r.startswith(('CircuitOpenError', 'Cancelled'))), reasons[0])
+        return {"error": f"{UNAVAILABLE_ERROR}: {reason}"}
+
+    if raw is not None:
+        for key, _ in OPERATIONS:
+            if key in responses: raw[key] = responses[key].content
+    if previous_raw is not None and raw_digests({k: r.content for k, r in responses.items()}) == previous_raw:
+        return {"file_no": hane_no, "unchanged": True}
+
+    # Ayrıştırma OPERATIONS sırasıyla yapılır (Citizen, CentralInvestigation'ın full_name'ine bakar)
+    for key, parser in OPERATIONS:
+        if key not in responses: continue
+        resp = responses[key]
+        t0 = time.perf_counter()
+        try: parser(kisi, resp)
+        except Exception as e: failed[key] = describe_error("parse", e)
+        if metrics is not None: operations[key]["parse_ms"] = ms(time.perf_counter() - t0)
+
+    return select_fields(kisi, fields)
+
+# Sonuç önbelleği: taze kayıt doğrudan döner; bayat kayıt (TTL'den sonra STALE süresi boyunca) hemen döner
+# ve arka planda yenilenir. AMF_CACHE=off ile kapatılır.
+# Her sonuca "_cache": {"state", "fetched_at"} eklenir; arayüz bayat veriyi bununla işaretler.
+CACHE_PATH = os.environ.get('AMF_CACHE', os.path.join(os.path.dirname(__file__), 'hane_cache.sqlite3'))
+CACHE_TTL = float(os.environ.get('AMF_CACHE_TTL', 6 * 3600))
+CACHE_STALE = float(os.environ.get('AMF_CACHE_STALE', 3600))
+# Ham AMF cevaplarını da sakla (AMF_CACHE_RAW=1)
+CACHE_RAW = os.environ.get('AMF_CACHE_RAW') == '1'
+
+_cache = None
+_cache_lock = threading.Lock()
+_refreshing = set()
+# Hane no -> son başarısız arka plan yenilemesinin nedeni (bayat sonuçla birlikte döner)
+_refresh_errors = {}
+_refresh_executor = ThreadPoolExecutor(max_workers=2)
+
+def get_cache():
+    global _cache
+    if CACHE_PATH == 'off': return None
+    with _cache_lock:
+        if _cache is None:
+            try: _cache = ResultCache(CACHE_PATH)
+            except sqlite3.Error: return None
+    return _cache
+
+def refresh(hane_no, executor=None, fields=None, metrics=None):
+    # Kısmi sonuçlar (yalnızca istenen alanlar ya da başarısız işlem içeren) önbelleğe yazılmaz
+    raw = {} if CACHE_RAW else None
+    metrics = {} if metrics is None else metrics
+    kisi = fetch_data(hane_no, executor=executor, raw=raw, fields=fields, metrics=metrics)
+    cache = get_cache()
+    if cache and "error" not in kisi and not fields and not metrics.get("failed"):
+        try: cache.put(hane_no, kisi, raw)
+        except sqlite3.Error: pass
+    return kisi
+
+def refresh_in_background(hane_no):
+    # Aynı hane için aynı anda tek yenileme; başarısızlık sayılır ve nedeni saklanır
+    with _cache_lock:
+        if hane_no in _refreshing: return
+        _refreshing.add(hane_no)
+    def run():
+        m = {}
         try:
-            env = remoting.decode(templates['getEntitiesWithTouchedProperties_HouseRecord'])
-            msg = env.items()[0][1]
-            if len(msg.body[0].body) > 2: msg.body[0].body[2][0] = hane_no
-            resp = requests.post(req_url, headers=req_headers, cookies=req_cookies, data=remoting.encode(env).getvalue(), verify=False)
-            
-            # TC ve Telefon için binary string tarama (sadece kısa sayısal değerler)
-            strs = extract_strings(resp.content)
-            for s in strs:
-                s = s.strip()
-                if re.match(r'^[1-9][0-9]{10}$', s): kisi["national_id"] = s
-                elif re.match(r'^05[0-9]{9}$', s) and s != '05305756968': kisi["phone"] = s
-            
-            # Adres: Yapısal AMF decode ile owner.currentAddress'ten oku
+            kisi = refresh(hane_no, metrics=m)
+            if "error" in kisi: error, reason = kisi["error"], "error"
+            elif m.get("failed"): error, reason = "Eksik sonuç: " + ", ".join(m["failed"]), "partial"
+            else: error, reason = None, None
+        except Exception as e: error, reason = f"{type(e).__name__}: {e}", "exception"
+        with _cache_lock:
+            _refreshing.discard(hane_no)
+            if error: _refresh_errors[hane_no] = error
+            else: _refresh_errors.pop(hane_no, None)
+        if error:
+            metrics_registry.inc("cache_refresh_failures_total", {"reason": reason})
+            print(f"Arka plan yenilemesi başarısız ({hane_no}): {error}", file=sys.stderr, flush=True)
+    _refresh_executor.submit(run)
+
+def cache_info(state, fetched_at, hane_no):
+    info = {"state": state, "fetched_at": datetime.fromtimestamp(fetched_at).isoformat(timespec='seconds')}
+    if state == "stale" and hane_no in _refresh_errors: info["refresh_error"] = _refresh_errors[hane_no]
+    return info
+
+def cached_lookup(hane_no, force_refresh=False, executor=None, fields=None, metrics=None):
+    # Kısmi istekler de önbellekteki tam kayıttan karşılanır
+    fields = parse_fields(fields)
+    cache = get_cache()
+    state = "off" if not cache else "bypass" if force_refresh else "miss"
+    if cache and not force_refresh:
+        try: hit = cache.get(hane_no)
+        except sqlite3.Error: hit = None
+        if hit:
+            kisi, age = hit
+            if age <= CACHE_TTL: state = "hit"
+            elif age <= CACHE_TTL + CACHE_STALE:
+                state = "stale"
+                refresh_in_background(hane_no)
+            if state != "miss":
+                if metrics is not None: metrics["cache"] = state
+                return {**select_fields(kisi, fields), "_cache": cache_info(state, time.time() - age, hane_no)}
+    if metrics is not None: metrics["cache"] = state
+    res = refresh(hane_no, executor=executor, fields=fields, metrics=metrics)
+    if "error" in res: return res
+    return {**res, "_cache": cache_info(state, time.time(), hane_no)}
+
+# Her sorgunun ölçümleri süreç sayaçlarına işlenir (worker'dan {"cmd": "stats"} ile okunur; metrics_registry.hooks'a
+# eklenen fonksiyonlar her sorguda çağrılır). Ölçüm modunda (AMF_METRICS=1 ya da --metrics) sonuca "_metrics" de eklenir.
+METRICS = os.environ.get('AMF_METRICS') == '1'
+metrics_registry = MetricsRegistry()
+
+def lookup(hane_no, force_refresh=False, executor=None, fields=None, metrics=None):
+    if metrics is None: metrics = METRICS
+    m = {}
+    t0 = time.perf_counter()
+    res = cached_lookup(hane_no, force_refresh=force_refresh, executor=executor, fields=fields, metrics=m)
+    m["wall_ms"] = ms(time.perf_counter() - t0)
+    m["ok"] = "error" not in res
+    metrics_registry.record(m)
+    return {**res, "_metrics": m} if metrics else res
+
+# Worker'da aynı anda işlenen sorgu sayısı; yavaş bir hane arkasındaki sorguları (önbellek isabetleri dahil) bekletmez
+WORKER_CONCURRENCY = int(os.environ.get('AMF_WORKER_CONCURRENCY', 8))
+
+def mount_http(pool_size):
+    # Aynı anda açık kalabilecek bağlantı sayısı eşzamanlı AMF çağrısı sayısı kadar olmalı
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    http.mount('https://', adapter)
+    http.mount('http://', adapter)
+
+def handle_request(req, executor=None):
+    if not isinstance(req, dict): req = {"file_no": req}
+    if req.get('cmd') == 'stats':
+        res = metrics_registry.render_text() if req.get('format') == 'prometheus' else metrics_registry.snapshot()
+        if req.get('reset'): metrics_registry.reset()
+        return res
+    if req.get('cmd') == 'sessions': return session_pool.status()
+    return lookup(int(req['file_no']), force_refresh=bool(req.get('refresh')), executor=executor, fields=req.get('fields'), metrics=req.get('metrics'))
+
+def serve_worker(stdin=None, stdout=None, concurrency=None):
+    # Kalıcı mod: her satır bir istek ({"id": .., "file_no": .., "refresh": bool, "fields": [..], "metrics": bool} veya sadece hane no),
+    # her cevap tek satır JSON. {"id": .., "cmd": "stats", "format": "json"|"prometheus", "reset": bool} toplanan ölçümleri,
+    # {"id": .., "cmd": "sessions"} oturum havuzunun durumunu döndürür.
+    # Sorgular aynı anda en fazla `concurrency` tane işlenir ve cevaplar bitiş sırasıyla yazılır (eşleştirme id ile);
+    # komutlar beklemeden okuma thread'inde cevaplanır.
+    stdin = stdin or sys.stdin.buffer
+    stdout = stdout or sys.stdout.buffer
+    concurrency = max(1, concurrency or WORKER_CONCURRENCY)
+    write_lock = threading.Lock()
+    mount_http(concurrency * len(OPERATIONS))
+
+    def reply(req_id, res):
+        data = json.dumps({"id": req_id, "result": res}, ensure_ascii=False).encode('utf-8') + b'\n'
+        with write_lock:
+            stdout.write(data)
+            stdout.flush()
+
+    def run(req_id, req):
+        try: res = handle_request(req, op_executor)
+        except Exception as e: res = {"error": str(e)}
+        reply(req_id, res)
+
+    with ThreadPoolExecutor(max_workers=concurrency * len(OPERATIONS)) as op_executor, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for line in stdin:
+            line = line.strip()
+            if not line: continue
+            req_id = None
             try:
-                resp_env = remoting.decode(resp.content)
-                for t, mess in resp_env.items():
-                    data = mess.body.body if hasattr(mess.body, 'body') else mess.body
-                    if isinstance(data, (list, pyamf.flex.ArrayCollection)):
-                        for obj in data:
-                            d = obj if isinstance(obj, dict) else getattr(obj, '__dict__', {})
-                            # Telefon numarası (HouseRecord seviyesinde)
-                            phone_hr = d.get('mobilePhoneNumber') or d.get('phoneNumber')
-                            if phone_hr and re.match(r'^05[0-9]{9}$', str(phone_hr)) and str(phone_hr) != '05305756968':
-                                kisi["phone"] = str(phone_hr)
-                            # owner.currentAddress'ten adres bilgisi
-                            owner = d.get('owner')
-                            if owner:
-                                owner_d = owner if isinstance(owner, dict) else getattr(owner, '__dict__', {})
-                                addr_obj = owner_d.get('currentAddress')
-                                if addr_obj:
-                                    a = addr_obj if isinstance(addr_obj, dict) else getattr(addr_obj, '__dict__', {})
-                                    mahalle = fix_turkish(str(a.get('mahalle', ''))) if a.get('mahalle') else ''
-                                    csmb = fix_turkish(str(a.get('csmb', ''))) if a.get('csmb') else ''  # Bina/Site/Küme adı
-                                    dis_kapi = str(a.get('disKapiNo', '')) if a.get('disKapiNo') else ''
-                                    ic_kapi = str(a.get('icKapiNo', '')) if a.get('icKapiNo') else ''
-                                    koy = fix_turkish(str(a.get('koy', ''))) if a.get('koy') else ''
-                                    
-                                    # İlçe ve İl bilgisi
-                                    ilce, il = '', ''
-                                    district = a.get('district')
-                                    if district:
-                                        dist_d = district if isinstance(district, dict) else getattr(district, '__dict__', {})
-                                        ilce = fix_turkish(str(dist_d.get('districtName', ''))) if dist_d.get('districtName') else ''
-                                        city = dist_d.get('city')
-                                        if city:
-                                            city_d = city if isinstance(city, dict) else getattr(city, '__dict__', {})
-                                            il = fix_turkish(str(city_d.get('cityName', ''))) if city_d.get('cityName') else ''
-                                    
-                                    # Adres formatla: "MAH. BİNA No: DIS/IC İLÇE/İL"
-                                    parts = []
-                                    if mahalle: parts.append(mahalle)
-                                    if csmb: parts.append(csmb)
-                                    if koy and not mahalle: parts.append(koy)
-                                    if dis_kapi:
-                                        no_str = f"No: {dis_kapi}"
-                                        if ic_kapi: no_str += f"/{ic_kapi}"
-                                        parts.append(no_str)
-                                    if ilce and il: parts.append(f"{ilce}/{il}")
-                                    elif ilce: parts.append(ilce)
-                                    elif il: parts.append(il)
-                                    
-                                    if parts:
-                                        kisi["address"] = ' '.join(parts)
-            except: pass
-        except: pass
+                req = json.loads(line)
+                if isinstance(req, dict):
+                    req_id = req.get('id')
+                    if req.get('cmd'):
+                        reply(req_id, handle_request(req))
+                        continue
+                executor.submit(run, req_id, req)
+            except Exception as e:
+                reply(req_id, {"error": str(e)})
 
-    # 4. Yardımlar - <b> etiketlerine göre satırlara böl
-    if 'getAidSummaryOfHouseRecord' in templates:
+def read_file_nos(path):
+    f = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8')
+    try:
+        for line in f:
+            for tok in re.split(r'[\s,;]+', line):
+                if tok: yield tok
+    finally:
+        if f is not sys.stdin: f.close()
+
+def run_batch(file_nos, concurrency=4, rps=None, force_refresh=False, fields=None, stdout=None, handle=None):
+    # Her hane bittiği anda tek satır JSON yazılır. Tek hanenin hatası toplu işi durdurmaz,
+    # oturum süresi dolduysa kalan haneler hiç gönderilmeden iş sonlandırılır.
+    # handle(file_no, executor) verilirse lookup yerine çağrılır; None dönen haneler için satır yazılmaz.
+    global RPS
+    stdout = stdout or sys.stdout.buffer
+    RPS = rps
+    pool_size = concurrency * len(OPERATIONS)
+    mount_http(pool_size)
+
+    def one(file_no):
         try:
-            env = remoting.decode(templates['getAidSummaryOfHouseRecord'])
-            env.items()[0][1].body[0].body = [hane_no]
-            resp = requests.post(req_url, headers=req_headers, cookies=req_cookies, data=remoting.encode(env).getvalue(), verify=False)
-            txt = fix_turkish(resp.content.decode('latin1', errors='ignore'))
-            
-            results = []
-            # Veri tek satırda geliyor: <b>TÜR</b>   TARİH   DURUM   MİKTARTL<b>TÜR</b>...
-            # <b> ile bölerek her yardımı ayrı satır olarak ele al
-            segments = re.split(r'<b>', txt)
-            for seg in segments:
-                if '</b>' not in seg: continue
-                # seg = "Diğer Eğitim Yardımı</b>   20 Şubat 2026   Tamamlandı   2.000,00TL"
-                seg_clean = seg.replace('</b>', '  ')  # </b> yerine boşluk koy
-                parts = [p.strip() for p in seg_clean.split('   ') if p.strip()]
-                # parts = ["Diğer Eğitim Yardımı", "20 Şubat 2026", "Tamamlandı", "2.000,00TL"]
-                if len(parts) >= 4:
-                    aid_type = map_aid_type(parts[0])
-                    d_iso = parse_turkish_date(parts[1])
-                    if not d_iso: continue
-                    # Miktar: son elemandan TL'yi temizle
-                    amt = parts[3].replace('TL', '').replace(' ', '').strip()
-                    results.append({"type": aid_type, "date": d_iso, "amount": amt})
-            
-            kisi["assistance_records"] = sorted(results, key=lambda x: x['date'], reverse=True)[:3]
-        except: pass
+            file_no = int(file_no)
+            if handle: res = handle(file_no, op_executor)
+            else: res = lookup(file_no, force_refresh=force_refresh, executor=op_executor, fields=fields)
+        except Exception as e: res = {"error": str(e)}
+        if res and "error" in res: res = {"file_no": file_no, **res}
+        return res
 
-    return kisi
+    expired = False
+    with ThreadPoolExecutor(max_workers=pool_size) as op_executor, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        it = iter(file_nos)
+        pending = set()
+        while True:
+            # Girdi akış olarak okunur: aynı anda en fazla `concurrency` hane işlenir
+            while not expired and len(pending) < concurrency:
+                file_no = next(it, None)
+                if file_no is None: break
+                pending.add(executor.submit(one, file_no))
+            if not pending: break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                res = fut.result()
+                if res is None: continue
+                stdout.write(json.dumps(res, ensure_ascii=False).encode('utf-8') + b'\n')
+                stdout.flush()
+                if res.get("error") == SESSION_EXPIRED_ERROR: expired = True
+            if expired:
+                for fut in pending: fut.cancel()
+    return 2 if expired else 0
 
-if __name__ == "__main__":
-    import urllib3
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+def main(argv=None):
+    global CACHE_PATH, METRICS, TIMEOUT, DEADLINE, RETRIES, SESSION_DIR
+    parser = argparse.ArgumentParser(description="Bütünleşik sistemden hane bilgilerini çeker.")
+    parser.add_argument('file_no', nargs='*', help="Hane numarası (birden fazlası toplu mod demektir)")
+    parser.add_argument('--worker', action='store_true', help="stdin/stdout JSON satırları ile kalıcı mod")
+    parser.add_argument('--batch', action='store_true', help="Toplu mod: her hane için bir JSON satırı yazar")
+    parser.add_argument('--input', help="Hane numaralarının okunacağı dosya ('-' = stdin)")
+    parser.add_argument('--concurrency', type=int, default=None, help=f"Aynı anda işlenen hane sayısı (toplu mod varsayılan 4, worker {WORKER_CONCURRENCY})")
+    parser.add_argument('--rps', type=float, default=None, help="Oturum başına saniyedeki en fazla AMF isteği")
+    parser.add_argument('--sessions', help="HAR/.session.json dosyalarının bulunduğu klasör; sorgular bu oturumlara dağıtılır (AMF_SESSIONS)")
+    parser.add_argument('--dispatch', choices=['least-loaded', 'round-robin'], default=None, help=f"Oturum seçimi (varsayılan {DISPATCH})")
+    parser.add_argument('--refresh', action='store_true', help="Önbelleği atlayıp canlı sorgula (sonuç önbelleğe yazılır)")
+    parser.add_argument('--no-cache', action='store_true', help="Önbelleği hiç kullanma")
+    parser.add_argument('--timeout', type=float, default=None, help=f"AMF isteği başına zaman aşımı, sn (varsayılan {TIMEOUT:g})")
+    parser.add_argument('--deadline', type=float, default=None, help=f"Hane başına toplam süre sınırı, sn; 0 = sınırsız (varsayılan {DEADLINE:g})")
+    parser.add_argument('--retries', type=int, default=None, help=f"Geçici hatalarda yeniden deneme sayısı (varsayılan {RETRIES})")
+    parser.add_argument('--metrics', action='store_true', help="Her sonuca süre/bayt ölçümlerini içeren _metrics bloğu ekle")
+    parser.add_argument('--fields', help=f"Virgülle ayrılmış çıktı alanları ({', '.join(FIELD_OPERATIONS)})")
+    args = parser.parse_args(argv)
+    try: fields = parse_fields(args.fields)
+    except ValueError as e: parser.error(str(e))
+
+    if args.no_cache: CACHE_PATH = 'off'
+    if args.metrics: METRICS = True
+    if args.timeout is not None: TIMEOUT = args.timeout
+    if args.deadline is not None: DEADLINE = args.deadline
+    if args.retries is not None: RETRIES = max(0, args.retries)
+    if args.sessions: SESSION_DIR = args.sessions
+    if args.dispatch: session_pool.mode = args.dispatch
+
+    if args.worker:
+        serve_worker(concurrency=args.concurrency)
+        return 0
+    if args.batch or args.input or len(args.file_no) > 1:
+        file_nos = args.file_no
+        if args.input or not file_nos: file_nos = read_file_nos(args.input or '-')
+        return run_batch(file_nos, concurrency=max(1, args.concurrency or 4), rps=args.rps, force_refresh=args.refresh, fields=fields)
+    if not args.file_no: parser.error("hane numarası gerekli")
     try:
-        res = fetch_data(int(sys.argv[1]))
+        res = lookup(int(args.file_no[0]), force_refresh=args.refresh, fields=fields)
         sys.stdout.buffer.write(json.dumps(res, ensure_ascii=False).encode('utf-8'))
+        sys.stdout.buffer.flush()
     except Exception as e:
         sys.stdout.buffer.write(json.dumps({"error": str(e)}).encode('utf-8'))
+    return 0
+
+if __name__ == "__main__":
+    import urllib3
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    sys.exit(main())
@@ -0,0 +1,95 @@
+# Hane sorgularının ölçümlerini süreç boyunca toplar (sayaç + histogram). fetch_person.py tarafından kullanılır.
+# Dışa aktarım: snapshot() (JSON), render_text() (Prometheus metin biçimi) ya da hooks listesine eklenen fonksiyonlar.
+import math
+import threading
+
+# Milisaniye cinsinden histogram sınırları
+MS_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, math.inf)
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class MetricsRegistry:
+    def __init__(self, buckets=MS_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        # Her sorgunun _metrics bloğu ile çağrılır (ör. StatsD/OTLP gönderimi)
+        self.hooks = []
+
+    def inc(self, name, labels=None, value=1):
+        key = _labels_key(labels or {})
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, labels=None):
+        key = _labels_key(labels or {})
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            h = series.get(key)
+            if h is None: h = series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    h["counts"][i] += 1
+                    break
+            h["sum"] += value
+            h["count"] += 1
+
+    def record(self, m):
+        # fetch_person.lookup'un _metrics bloğunu sayaçlara işler, sonra hook'ları çağırır
+        self.inc("lookups_total", {"cache": m.get("cache", ""), "outcome": "ok" if m.get("ok", True) else "error"})
+        if "session" in m: self.inc("session_lookups_total", {"session": m["session"], "outcome": "ok" if m.get("ok", True) else "error"})
+        if "wall_ms" in m: self.observe("lookup_ms", m["wall_ms"])
+        if "session_ms" in m: self.observe("session_load_ms", m["session_ms"])
+        for op, o in m.get("operations", {}).items():
+            if "status" in o:
+                self.inc("amf_requests_total", {"op": op, "status": str(o["status"])})
+                self.inc("amf_response_bytes_total", {"op": op}, o.get("bytes", 0))
+            if "request_ms" in o: self.observe("amf_request_ms", o["request_ms"], {"op": op})
+            if "parse_ms" in o: self.observe("amf_parse_ms", o["parse_ms"], {"op": op})
+        for op, f in m.get("failed", {}).items():
+            self.inc("amf_failures_total", {"op": op, "stage": f["stage"]})
+        for hook in list(self.hooks):
+            # Dışa aktarım hatası sorguyu bozmaz, yalnızca sayılır
+            try: hook(m)
+            except Exception: self.inc("metrics_hook_errors_total")
+
+    def snapshot(self):
+        with self.lock:
+            counters = {name: [{"labels": dict(k), "value": v} for k, v in series.items()] for name, series in self.counters.items()}
+            histograms = {name: [{"labels": dict(k), "buckets": [["+Inf" if b == math.inf else b, c] for b, c in zip(self.buckets, h["counts"])],
+                                  "sum": round(h["sum"], 3), "count": h["count"]} for k, h in series.items()]
+                          for name, series in self.histograms.items()}
+        return {"counters": counters, "histograms": histograms}
+
+    def render_text(self, prefix='amf_bot_'):
+        # Prometheus metin biçimi; histogram kovaları kümülatif yazılır
+        def fmt(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items: return ''
+            return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+        lines = []
+        with self.lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {prefix}{name} counter")
+                for k, v in sorted(series.items()): lines.append(f"{prefix}{name}{fmt(k)} {v}")
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {prefix}{name} histogram")
+                for k, h in sorted(series.items()):
+                    total = 0
+                    for bound, c in zip(self.buckets, h["counts"]):
+                        total += c
+                        lines.append(f"{prefix}{name}_bucket{fmt(k, [('le', '+Inf' if bound == math.inf else bound)])} {total}")
+                    lines.append(f"{prefix}{name}_sum{fmt(k)} {round(h['sum'], 3)}")
+                    lines.append(f"{prefix}{name}_count{fmt(k)} {h['count']}")
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
@@ -0,0 +1,120 @@
+# Kayıtlı AMF cevaplarını yerel bir HTTP sunucusundan tekrar oynatır; canlı sisteme gitmeden ölçüm ve deneme için.
+#   python amf_bot/replay_server.py --har amf_bot/fixtures/replay.har --latency 0.05
+#   python amf_bot/replay_server.py --fixtures kayitlar/   # <anahtar>.amf dosyaları
+import os
+import sys
+import json
+import time
+import base64
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import fetch_person as fp
+from pyamf import remoting
+
+def load_har_responses(har_path):
+    # HAR'daki her AMF isteği için kaydedilmiş cevap, şablon anahtarına göre (ilk kayıt geçerli)
+    responses = {}
+    for entry in fp.iter_har_entries(har_path):
+        req, content = entry['request'], entry.get('response', {}).get('content', {})
+        if 'amf' not in req.get('url', '') or 'text' not in req.get('postData', {}) or not content.get('text'): continue
+        post = req['postData']
+        try:
+            data = base64.b64decode(post['text']) if post.get('encoding') == 'base64' else post['text'].encode('latin1')
+            body = base64.b64decode(content['text']) if content.get('encoding') == 'base64' else content['text'].encode('latin1')
+            for t, msg in remoting.decode(data).items():
+                key = fp.operation_key(msg)
+                if key and key not in responses: responses[key] = body
+        except: pass
+    return responses
+
+def load_fixture_responses(fixtures_dir):
+    responses = {}
+    for name in os.listdir(fixtures_dir):
+        if name.endswith('.amf'):
+            with open(os.path.join(fixtures_dir, name), 'rb') as f: responses[name[:-len('.amf')]] = f.read()
+    return responses
+
+def route(responses, body):
+    # İstek tamamen çözülmez: işlem adı (ve varlık sınıfı) bayt olarak aranır
+    for key in sorted(responses, key=len, reverse=True):
+        op, _, entity = key.partition('_')
+        if op.encode() in body and (not entity or entity.encode() in body): return key
+    return None
+
+class _Server(ThreadingHTTPServer):
+    # Toplu ölçümde aynı anda çok sayıda bağlantı açılır; varsayılan kuyruk (5) SYN tekrarlarına yol açar
+    request_queue_size = 128
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Zaman aşımıyla bağlantıyı kapatan istemciler beklenen bir durum
+        if not isinstance(sys.exc_info()[1], ConnectionError): super().handle_error(request, client_address)
+
+class ReplayServer:
+    def __init__(self, responses, latency=0.0, jitter=0.0, host='127.0.0.1', port=0):
+        self.responses = responses
+        self.latency, self.jitter = latency, jitter
+        self.hits = {}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive: istemci bağlantıları yeniden kullanır. Başlık ve gövde ayrı yazıldığı için
+            # Nagle kapatılır (aksi halde her cevapta ~40ms gecikmiş ACK beklemesi olur).
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args): pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                key = route(server.responses, body)
+                delay = server.latency + random.uniform(0, server.jitter)
+                if delay > 0: time.sleep(delay)
+                if key is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                server.hits[key] = server.hits.get(key, 0) + 1
+                out = server.responses[key]
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-amf')
+                self.send_header('Content-Length', str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+        self.httpd = _Server((host, port), Handler)
+        self.url = f"http://{host}:{self.httpd.server_address[1]}/messagebroker/amf"
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kayıtlı AMF cevaplarını yerel olarak tekrar oynatır")
+    parser.add_argument('--har', default=fp.HAR_PATH, help="Cevapların alınacağı HAR dosyası")
+    parser.add_argument('--fixtures', help="<anahtar>.amf dosyalarının bulunduğu klasör (HAR yerine)")
+    parser.add_argument('--latency', type=float, default=0.0, help="Her cevaba eklenen gecikme (saniye)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Gecikmeye eklenen rastgele pay (saniye)")
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    responses = load_fixture_responses(args.fixtures) if args.fixtures else load_har_responses(args.har)
+    if not responses: parser.error("tekrar oynatılacak AMF cevabı bulunamadı")
+    server = ReplayServer(responses, latency=args.latency, jitter=args.jitter, port=args.port)
+    print(json.dumps({"url": server.url, "operations": sorted(responses)}), flush=True)
+    try: server.httpd.serve_forever()
+    except KeyboardInterrupt: pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+# Hane bazında sonuç önbelleği (SQLite). fetch_person.py tarafından kullanılır.
+import json
+import time
+import base64
+import sqlite3
+import threading
+
+class ResultCache:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # Aynı dosyayı worker ve CLI süreçleri birlikte kullanabilir
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS households (
+                    file_no INTEGER PRIMARY KEY,
+                    kisi TEXT NOT NULL,
+                    raw TEXT,
+                    fetched_at REAL NOT NULL
+                )""")
+
+    def get(self, file_no):
+        # (kisi, yaş saniye) ya da None
+        with self.lock:
+            row = self.conn.execute("SELECT kisi, fetched_at FROM households WHERE file_no = ?", (file_no,)).fetchone()
+        if not row: return None
+        return json.loads(row[0]), time.time() - row[1]
+
+    def get_raw(self, file_no):
+        # İşlem bazında ham AMF cevapları ({anahtar: bytes}); saklanmadıysa None
+        with self.lock:
+            row = self.conn.execute("SELECT raw FROM households WHERE file_no = ?", (file_no,)).fetchone()
+        if not row or not row[0]: return None
+        return {k: base64.b64decode(v) for k, v in json.loads(row[0]).items()}
+
+    def put(self, file_no, kisi, raw=None):
+        raw_json = json.dumps({k: base64.b64encode(v).decode('ascii') for k, v in raw.items()}) if raw else None
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO households (file_no, kisi, raw, fetched_at) VALUES (?, ?, ?, ?)",
+                              (file_no, json.dumps(kisi, ensure_ascii=False), raw_json, time.time()))
+
+    def delete(self, file_no):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM households WHERE file_no = ?", (file_no,))
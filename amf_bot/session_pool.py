@@ -0,0 +1,88 @@
+# Hane sorgularını birden fazla HAR/oturum dosyası arasında dağıtır. fetch_person.py tarafından kullanılır.
+# Süresi dolan ya da devre kesicisi açık oturumlar sıradan çıkarılır; HAR yenilenince oturum yeni sağlık kaydıyla döner.
+import os
+import time
+import threading
+
+class SessionHealth:
+    # Oturum başına eşzamanlı sorgu sayısı, hata oranı ve hane süresi (üstel hareketli ortalama)
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.lookups = 0
+        self.errors = 0
+        self.error_rate = 0.0
+        self.latency_ms = None
+        self.last_at = 0.0
+
+    def start(self):
+        with self.lock:
+            self.inflight += 1
+            self.last_at = time.monotonic()
+
+    def finish(self, ok, elapsed_ms):
+        with self.lock:
+            self.inflight -= 1
+            self.lookups += 1
+            if not ok: self.errors += 1
+            self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+            if ok: self.latency_ms = elapsed_ms if self.latency_ms is None else self.latency_ms + self.alpha * (elapsed_ms - self.latency_ms)
+
+class SessionPool:
+    # list_paths() oturum dosyalarını, load(yol) oturum dict'ini ya da {"error": ..} döndürür.
+    # mode: "least-loaded" (eşzamanlı sorgusu en az olan) ya da "round-robin".
+    # Hata oranı max_error_rate'i aşan oturum sıradan çıkar; probe_interval sn kullanılmazsa tek sorguyla yeniden denenir.
+    def __init__(self, list_paths, load, is_expired, expired_error, mode='least-loaded', max_error_rate=0.5, min_samples=5, probe_interval=30.0):
+        self.list_paths, self.load, self.is_expired = list_paths, load, is_expired
+        self.expired_error = expired_error
+        self.mode = mode
+        self.max_error_rate, self.min_samples, self.probe_interval = max_error_rate, min_samples, probe_interval
+        self.lock = threading.Lock()
+        self.turn = 0
+
+    def sessions(self):
+        loaded, errors = [], []
+        for path in self.list_paths():
+            session = self.load(path)
+            if "error" in session: errors.append(session)
+            else: loaded.append((path, session))
+        return loaded, errors
+
+    def healthy(self, session):
+        h = session["health"]
+        return h.lookups < self.min_samples or h.error_rate <= self.max_error_rate or time.monotonic() - h.last_at >= self.probe_interval
+
+    def acquire(self, exclude=()):
+        # (yol, oturum) döner ve oturumun sorgu sayacı artırılır; kullanılabilir oturum yoksa (None, hata dict'i)
+        loaded, errors = self.sessions()
+        if not loaded: return None, errors[0] if errors else {"error": "Oturum bulunamadi."}
+        alive = [(p, s) for p, s in loaded if p not in exclude and not self.is_expired(s)]
+        if not alive: return None, {"error": self.expired_error}
+        # Devre kesicisi açık ya da hata oranı yüksek oturumlar yalnızca başka seçenek yoksa kullanılır
+        usable = [c for c in alive if c[1]["breaker"].state != "open"] or alive
+        candidates = [c for c in usable if self.healthy(c[1])] or usable
+        with self.lock:
+            self.turn += 1
+            start = self.turn % len(candidates)
+            ordered = candidates[start:] + candidates[:start]
+            if self.mode == 'least-loaded':
+                # Eşitlikte sıra döner (ölçülen süre seçimde kullanılmaz: ilk sorgusu yavaş olan oturum hiç seçilmez hale gelirdi)
+                path, session = min(ordered, key=lambda c: c[1]["health"].inflight)
+            else:
+                path, session = ordered[0]
+            session["health"].start()
+        return path, session
+
+    def release(self, session, ok, elapsed_ms):
+        session["health"].finish(ok, elapsed_ms)
+
+    def status(self):
+        loaded, errors = self.sessions()
+        res = []
+        for path, s in loaded:
+            h = s["health"]
+            res.append({"session": os.path.basename(path), "expired": self.is_expired(s), "breaker": s["breaker"].state,
+                        "healthy": self.healthy(s), "inflight": h.inflight, "lookups": h.lookups, "errors": h.errors,
+                        "error_rate": round(h.error_rate, 3), "latency_ms": None if h.latency_ms is None else round(h.latency_ms, 2)})
+        return {"mode": self.mode, "sessions": res, "errors": [e["error"] for e in errors]}
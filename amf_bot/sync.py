@@ -0,0 +1,134 @@
+# Kayıtlı hanelerin toplu yeniden kontrolü: yalnızca çıkarılan alanları değişen haneler yazılır.
+# Önceki sonuçlar anlık görüntüde tutulur (hane no -> normalize kisi özeti + işlem bazında ham cevap özetleri);
+# ham cevapları aynı kalan hanelerde ayrıştırma yapılmaz.
+#   python amf_bot/sync.py --input hane_nolar.txt > degisiklikler.jsonl
+#   python amf_bot/sync.py 1001 1002 --snapshot /tmp/snapshot.sqlite3
+# Çıktı (satır başına bir JSON):
+#   {"file_no": 1, "new": {...}}                   ilk kez görülen hane, tüm alanlar
+#   {"file_no": 1, "changed": {"phone": "05.."}}   yalnızca değişen alanlar, yeni değerleriyle
+#   {"file_no": 1, "error": "..."}                 sorgu hatası ya da eksik sonuç (görüntü güncellenmez)
+# Değişmeyen haneler için satır yazılmaz; sonunda stderr'e özet yazılır.
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+
+import fetch_person as fp
+
+SNAPSHOT_PATH = os.environ.get('AMF_SYNC_SNAPSHOT', os.path.join(os.path.dirname(__file__), 'sync_snapshot.sqlite3'))
+
+class SyncSnapshot:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    file_no INTEGER PRIMARY KEY,
+                    kisi_hash TEXT NOT NULL,
+                    raw_hashes TEXT NOT NULL,
+                    kisi TEXT NOT NULL,
+                    synced_at REAL NOT NULL
+                )""")
+
+    def get(self, file_no):
+        # (kisi, kisi özeti, {işlem: ham cevap özeti}) ya da None
+        with self.lock:
+            row = self.conn.execute("SELECT kisi, kisi_hash, raw_hashes FROM snapshots WHERE file_no = ?", (file_no,)).fetchone()
+        if not row: return None
+        return json.loads(row[0]), row[1], json.loads(row[2])
+
+    def put(self, file_no, kisi, kisi_hash, raw_hashes):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO snapshots (file_no, kisi_hash, raw_hashes, kisi, synced_at) VALUES (?, ?, ?, ?, ?)",
+                              (file_no, kisi_hash, json.dumps(raw_hashes, sort_keys=True), json.dumps(kisi, ensure_ascii=False), time.time()))
+
+    def touch(self, file_no):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE snapshots SET synced_at = ? WHERE file_no = ?", (time.time(), file_no))
+
+def kisi_hash(kisi):
+    # Anahtar sırasından bağımsız özet
+    return hashlib.sha256(json.dumps(kisi, sort_keys=True, ensure_ascii=False, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+def diff_fields(old, new):
+    return {k: v for k, v in new.items() if old.get(k) != v}
+
+class Syncer:
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.lock = threading.Lock()
+        self.stats = {"checked": 0, "new": 0, "changed": 0, "unchanged": 0, "parse_skipped": 0, "errors": 0}
+
+    def count(self, *names):
+        with self.lock:
+            for name in ("checked",) + names: self.stats[name] += 1
+
+    def cache_put(self, file_no, kisi, raw):
+        # Worker'ın önbelleği de güncel sonuçla tazelenir
+        cache = fp.get_cache()
+        if not cache: return
+        try: cache.put(file_no, kisi, raw if fp.CACHE_RAW else None)
+        except sqlite3.Error: pass
+
+    def handle(self, file_no, executor):
+        prev = self.snapshot.get(file_no)
+        raw, metrics = {}, {}
+        res = fp.fetch_data(file_no, executor=executor, raw=raw, metrics=metrics, previous_raw=prev[2] if prev else None)
+        if "error" in res:
+            self.count("errors")
+            return res
+        if metrics.get("failed"):
+            # Eksik sonuç değişiklik gibi görünmesin diye yazılmaz
+            self.count("errors")
+            return {"error": "Eksik sonuç: " + "; ".join(f"{k}: {v['error']}" for k, v in metrics["failed"].items())}
+        if res.get("unchanged"):
+            self.count("unchanged", "parse_skipped")
+            self.snapshot.touch(file_no)
+            self.cache_put(file_no, prev[0], raw)
+            return None
+        h = kisi_hash(res)
+        self.snapshot.put(file_no, res, h, fp.raw_digests(raw))
+        self.cache_put(file_no, res, raw)
+        if prev is None:
+            self.count("new")
+            return {"file_no": file_no, "new": {k: v for k, v in res.items() if k != "file_no"}}
+        if h == prev[1]:
+            self.count("unchanged")
+            return None
+        self.count("changed")
+        return {"file_no": file_no, "changed": diff_fields(prev[0], res)}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Haneleri yeniden sorgular, yalnızca değişenleri yazar.")
+    parser.add_argument('file_no', nargs='*', help="Hane numaraları (yoksa --input ya da stdin)")
+    parser.add_argument('--input', help="Hane numaralarının okunacağı dosya ('-' = stdin)")
+    parser.add_argument('--snapshot', default=SNAPSHOT_PATH, help="Önceki sonuçların tutulduğu SQLite dosyası")
+    parser.add_argument('--concurrency', type=int, default=4, help="Aynı anda işlenen hane sayısı")
+    parser.add_argument('--rps', type=float, default=None, help="Oturum başına saniyedeki en fazla AMF isteği")
+    parser.add_argument('--sessions', help="HAR/.session.json klasörü (AMF_SESSIONS)")
+    parser.add_argument('--no-cache', action='store_true', help="Sonuç önbelleğini güncelleme")
+    args = parser.parse_args(argv)
+
+    if args.no_cache: fp.CACHE_PATH = 'off'
+    if args.sessions: fp.SESSION_DIR = args.sessions
+    file_nos = args.file_no
+    if args.input or not file_nos: file_nos = fp.read_file_nos(args.input or '-')
+
+    syncer = Syncer(SyncSnapshot(args.snapshot))
+    t0 = time.perf_counter()
+    status = fp.run_batch(file_nos, concurrency=max(1, args.concurrency), rps=args.rps, handle=syncer.handle)
+    summary = {**syncer.stats, "elapsed_s": round(time.perf_counter() - t0, 2)}
+    print(json.dumps(summary, ensure_ascii=False), file=sys.stderr)
+    return status
+
+if __name__ == "__main__":
+    import urllib3
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    sys.exit(main())
@@ -323,41 +323,134 @@ app.use('/api/household_image', authenticateToken);
 app.use('/api/external', authenticateToken);
 
 // --- External API Bridge ---
-app.get('/api/external/fetch/:file_no', async (req, res) => {
-    const { file_no } = req.params;
-    console.log(`[EXTERNAL] Fetching data for File No: ${file_no}`);
-    
-    // Python betiğini çalıştır
-    const scriptPath = path.join(__dirname, '..', 'amf_bot', 'fetch_person.py');
-    const pythonProcess = spawn('python', [scriptPath, file_no]);
-
-    let dataString = '';
-    let errorString = '';
-
-    pythonProcess.stdout.on('data', (data) => {
-        dataString += data.toString();
+// Python betiği kalıcı worker olarak çalışır (HAR ve TLS bağlantısı sıcak tutulur).
+// Protokol: stdin'e satır başına {"id", "file_no", "refresh", "fields", "metrics"}, stdout'tan satır başına {"id", "result"}.
+// Sonuçlar Python tarafında önbelleklenir; ?refresh=1 canlı sorguyu zorlar, ?fields=a,b yalnızca gereken sorguları çalıştırır,
+// ?metrics=1 sonuca süre/bayt ölçümlerini (_metrics) ekler. Toplanan ölçümler /api/external/metrics altında.
+// Her sonuçta _cache: {state, fetched_at} bulunur; state "stale" ise kayıt bayattır ve arka planda yenilenir.
+// AMF_SESSIONS=<klasör> ile worker sorguları klasördeki birden fazla HAR oturumuna dağıtır.
+const AMF_SCRIPT = path.join(__dirname, '..', 'amf_bot', 'fetch_person.py');
+let amfWorker = null;
+let amfSeq = 0;
+const amfPending = new Map();
+
+const getAmfWorker = () => {
+    if (amfWorker) return amfWorker;
+    const proc = spawn('python', [AMF_SCRIPT, '--worker']);
+    proc.lastLineAt = Date.now();
+    // Cevabı henüz gelmemiş istekler (id -> gönderilme zamanı); zaman aşımına düşenler de cevapları gelene kadar burada kalır
+    proc.outstanding = new Map();
+    let buffer = '';
+    proc.stdout.setEncoding('utf8');
+    proc.stdout.on('data', (chunk) => {
+        buffer += chunk;
+        let idx;
+        while ((idx = buffer.indexOf('\n')) >= 0) {
+            const line = buffer.slice(0, idx).trim();
+            buffer = buffer.slice(idx + 1);
+            if (!line) continue;
+            proc.lastLineAt = Date.now();
+            try {
+                const msg = JSON.parse(line);
+                proc.outstanding.delete(msg.id);
+                const pending = amfPending.get(msg.id);
+                if (pending) {
+                    amfPending.delete(msg.id);
+                    pending.resolve(msg.result);
+                }
+            } catch (e) {
+                console.error('AMF worker JSON Parse Error:', line);
+            }
+        }
+    });
+    proc.stderr.on('data', (data) => {
+        console.error(`[AMF] ${data.toString()}`);
     });
+    proc.on('close', (code) => {
+        console.error(`AMF worker exited with code ${code}`);
+        if (amfWorker === proc) amfWorker = null;
+        // Yalnızca bu süreçteki istekler düşer; yeniden başlatılan worker'a gönderilenler beklemeye devam eder
+        for (const [id, pending] of amfPending) {
+            if (pending.proc !== proc) continue;
+            amfPending.delete(id);
+            pending.reject(new Error(`AMF worker exited with code ${code}`));
+        }
+    });
+    proc.on('error', (err) => {
+        console.error('AMF worker spawn error:', err);
+    });
+    proc.stdin.on('error', (err) => {
+        console.error('AMF worker stdin error:', err.message);
+    });
+    amfWorker = proc;
+    return proc;
+};
 
-    pythonProcess.stderr.on('data', (data) => {
-        errorString += data.toString();
+// Python tarafı hane başına süre sınırı (AMF_DEADLINE) uygular; bu yalnızca tek isteğin beklenme sınırı.
+// Süre dolunca yalnızca o istek reddedilir (worker sorguları paralel işler, kuyrukta bekleyen istek de bu süreyi aşabilir).
+const AMF_REQUEST_TIMEOUT_MS = parseInt(process.env.AMF_REQUEST_TIMEOUT_MS) || 90000;
+// Cevap beklenen istek varken worker bu süre boyunca hiç satır yazmadıysa takılmıştır: süreç sonlandırılır, sonraki istek yenisini başlatır.
+// Sağlıklı worker'da her sorgu AMF_DEADLINE içinde biter, yani meşgulken de en geç bu kadar sürede bir cevap gelir.
+const AMF_WORKER_STALL_MS = parseInt(process.env.AMF_WORKER_STALL_MS) || 90000;
+
+setInterval(() => {
+    const proc = amfWorker;
+    if (!proc) return;
+    if (!proc.outstanding.size) return;
+    const oldest = Math.min(...proc.outstanding.values());
+    // Boşta geçen süre sayılmaz: sessizlik en eski bekleyen isteğin gönderilmesinden itibaren ölçülür
+    if (Date.now() - Math.max(proc.lastLineAt, oldest) < AMF_WORKER_STALL_MS) return;
+    console.error(`AMF worker ${AMF_WORKER_STALL_MS} ms boyunca cevap yazmadı, yeniden başlatılıyor`);
+    amfWorker = null;
+    proc.kill();
+}, 5000).unref();
+
+const amfRequest = (payload) => new Promise((resolve, reject) => {
+    const id = ++amfSeq;
+    const proc = getAmfWorker();
+    const timer = setTimeout(() => {
+        amfPending.delete(id);
+        reject(new Error(`AMF worker ${AMF_REQUEST_TIMEOUT_MS} ms içinde cevap vermedi`));
+    }, AMF_REQUEST_TIMEOUT_MS);
+    amfPending.set(id, {
+        proc,
+        resolve: (v) => { clearTimeout(timer); resolve(v); },
+        reject: (e) => { clearTimeout(timer); reject(e); },
     });
+    proc.outstanding.set(id, Date.now());
+    proc.stdin.write(JSON.stringify({ id, ...payload }) + '\n');
+});
 
-    pythonProcess.on('close', (code) => {
-        if (code !== 0) {
-            console.error(`Python Process exited with code ${code}. Error: ${errorString}`);
-            return res.status(500).json({ error: 'Sorgulama sırasında bir hata oluştu.', details: errorString });
-        }
-        try {
-            const result = JSON.parse(dataString);
-            if (result.error) {
-                return res.status(400).json(result);
-            }
-            res.json(result);
-        } catch (e) {
-            console.error('JSON Parse Error:', dataString);
-            res.status(500).json({ error: 'Veri ayrıştırma hatası.' });
+const amfFetch = (file_no, refresh = false, fields = null, metrics = null) => amfRequest({ file_no, refresh, fields, metrics });
+
+app.get('/api/external/fetch/:file_no', async (req, res) => {
+    const { file_no } = req.params;
+    const refresh = req.query.refresh === '1' || req.query.refresh === 'true';
+    const fields = req.query.fields || null;
+    const metrics = req.query.metrics === '1' || req.query.metrics === 'true' ? true : null;
+    console.log(`[EXTERNAL] Fetching data for File No: ${file_no}${refresh ? ' (refresh)' : ''}${fields ? ` fields=${fields}` : ''}`);
+
+    try {
+        const result = await amfFetch(file_no, refresh, fields, metrics);
+        if (result.error) {
+            return res.status(400).json(result);
         }
-    });
+        res.json(result);
+    } catch (e) {
+        console.error('AMF worker error:', e.message);
+        res.status(500).json({ error: 'Sorgulama sırasında bir hata oluştu.', details: e.message });
+    }
+});
+
+// Worker'ın topladığı sayaç/histogramlar (varsayılan Prometheus metin biçimi, ?format=json)
+app.get('/api/external/metrics', async (req, res) => {
+    try {
+        if (req.query.format === 'json') return res.json(await amfRequest({ cmd: 'stats' }));
+        res.type('text/plain; version=0.0.4').send(await amfRequest({ cmd: 'stats', format: 'prometheus' }));
+    } catch (e) {
+        console.error('AMF worker error:', e.message);
+        res.status(500).json({ error: 'Ölçümler alınamadı.', details: e.message });
+    }
 });
 
 // Routes
@@ -57,6 +57,8 @@ export function PersonForm({ inlineId, onClose }) {
     const [loading, setLoading] = useState(false);
     const [fetchingFromSystem, setFetchingFromSystem] = useState(false);
     const [fetchSuccess, setFetchSuccess] = useState(false);
+    // Önbellekten dönen bayat sonuç: { fetched_at, refresh_error }
+    const [fetchStale, setFetchStale] = useState(null);
     const [initialLoading, setInitialLoading] = useState(isEditing);
     const [fileNoStatus, setFileNoStatus] = useState({ status: 'idle', person: null });
 
@@ -104,6 +106,7 @@ export function PersonForm({ inlineId, onClose }) {
                 setAssistanceRecords(newRecords);
             }
             
+            setFetchStale(data._cache?.state === 'stale' ? data._cache : null);
             setFetchSuccess(true);
             setTimeout(() => setFetchSuccess(false), 3000);
         } catch (error) {
@@ -369,6 +372,14 @@ export function PersonForm({ inlineId, onClose }) {
                                                 ✓ Başarıyla çekildi
                                             </span>
                                         )}
+                                        {fetchStale && (
+                                            <span
+                                                className="text-[10px] text-amber-600 font-bold"
+                                                title={fetchStale.refresh_error || 'Güncel veri arka planda yenileniyor'}
+                                            >
+                                                ⚠ Önbellekten ({new Date(fetchStale.fetched_at).toLocaleString('tr-TR')})
+                                            </span>
+                                        )}
                                         <button
                                             type="button"
                                             onClick={handleFetchFromSystem}